@@ -0,0 +1,300 @@
+import os, sys, json, time, tempfile, tracemalloc, argparse, hashlib
+import main
+
+# folder holding recorded registry responses (index.json maps each URL to the file holding its body)
+FIXTURE_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_fixtures")
+DEFAULT_RESOURCES = ["deployment/v1", "service/v1", "stateful_set/v1", "secret/v1"]
+
+# Purpose:
+#   This is a stand-in for the response objects returned by requests, holding a recorded (or generated) body.
+
+class ReplayResponse:
+  def __init__(self, url, content, status_code=200):
+    self.url = url
+    self.content = content
+    self.status_code = status_code
+
+  def json(self):
+    return json.loads(self.content)
+
+  def raise_for_status(self):
+    if self.status_code >= 400:
+      raise RuntimeError(f"{self.status_code} for {self.url}")
+
+# Purpose:
+#   This replaces the registry session used by main.http_get() and answers every request from the responses
+#   recorded in a fixture folder, so a benchmark never touches the network.
+# params:
+#    fixture_folder: a folder written by RecordingSession
+
+class ReplaySession:
+  def __init__(self, fixture_folder):
+    self.fixture_folder = fixture_folder
+    with open(os.path.join(fixture_folder, "index.json")) as index_file:
+      self.index = json.load(index_file)
+    self.requests = 0
+
+  def get(self, url, timeout=None):
+    self.requests += 1
+    if url not in self.index:
+      return ReplayResponse(url, b"{}", 404)
+    with open(os.path.join(self.fixture_folder, self.index[url]), "rb") as body_file:
+      return ReplayResponse(url, body_file.read())
+
+# Purpose:
+#   This wraps a real requests session and saves every response it receives into a fixture folder, so the live
+#   registry only needs to be reached once to record the responses that later benchmarks replay.
+# params:
+#    session: the session that performs the real requests
+#    fixture_folder: the folder the responses are written to
+
+class RecordingSession:
+  def __init__(self, session, fixture_folder):
+    self.session = session
+    self.fixture_folder = fixture_folder
+    os.makedirs(fixture_folder, exist_ok=True)
+    index_path = os.path.join(fixture_folder, "index.json")
+    self.index = {}
+    if os.path.exists(index_path):
+      with open(index_path) as index_file:
+        self.index = json.load(index_file)
+
+  def get(self, url, timeout=None):
+    response = self.session.get(url, timeout=timeout)
+    response.raise_for_status()
+    file_name = hashlib.sha256(url.encode("utf-8")).hexdigest()[:16] + ".json"
+    with open(os.path.join(self.fixture_folder, file_name), "wb") as body_file:
+      body_file.write(response.content)
+    self.index[url] = file_name
+    with open(os.path.join(self.fixture_folder, "index.json"), "w") as index_file:
+      json.dump(self.index, index_file, indent=1, sort_keys=True)
+    return response
+
+# Purpose:
+#   This answers registry requests with generated responses shaped like the old kubernetes provider docs. It lets
+#   the benchmark run when nothing has been recorded yet; timings against recorded fixtures are more realistic.
+# params:
+#    resources: a list of (kind, resource_version) pairs to generate docs for
+#    extra_sections: the number of filler sections added to each doc to make the pages larger
+
+class SyntheticRegistrySession:
+  def __init__(self, resources, extra_sections=0):
+    self.pages = {}
+    for kind, resource_version in resources:
+      self.pages[f"kubernetes_{kind}_{resource_version}"] = generate_resource_doc(kind, resource_version, extra_sections)
+    self.requests = 0
+
+  def get(self, url, timeout=None):
+    self.requests += 1
+    if url.startswith("https://registry.terraform.io/v2/providers/"):
+      payload = {"data": {"relationships": {"provider-versions": {"data": [{"id": str(main.WORKING_PROVIDER_VERSION)}]}}}}
+    elif url.startswith("https://registry.terraform.io/v2/provider-versions/"):
+      payload = {"included": [
+        {"attributes": {"slug": slug, "category": "resources"}, "links": {"self": f"/v2/provider-docs/{slug}"}}
+        for slug in self.pages]}
+    elif url.startswith("https://registry.terraform.io/v2/provider-docs/"):
+      slug = url.rsplit("/", 1)[-1]
+      if slug not in self.pages:
+        return ReplayResponse(url, b"{}", 404)
+      payload = {"data": {"attributes": {"content": self.pages[slug]}}}
+    else:
+      return ReplayResponse(url, b"{}", 404)
+    return ReplayResponse(url, json.dumps(payload).encode("utf-8"))
+
+# returns the markdown of a generated resource doc, formatted like terraform's old kubernetes docs
+def generate_resource_doc(kind, resource_version, extra_sections=0):
+  sections = [
+    ("metadata", ["annotations", "generate_name", "labels", "name", "namespace"]),
+    ("spec", ["replicas", "revision_history_limit", "selector", "template"]),
+    ("selector", ["match_expressions", "match_labels"]),
+    ("template", ["metadata", "spec"]),
+    ("pod", ["spec"]),
+    ("pod spec", ["container", "image_pull_secrets", "volume"]),
+    ("container", ["args", "env", "image", "image_pull_policy", "name", "port", "resources"]),
+    ("env", ["name", "value", "value_from"]),
+    ("value_from", ["secret_key_ref"]),
+    ("secret_key_ref", ["key", "name"]),
+    ("port", ["container_port", "name"]),
+    ("resources", ["limits", "requests"]),
+  ]
+  for number in range(extra_sections):
+    sections.append((f"extra_{number}", [f"attribute_{child}" for child in range(10)]))
+  lines = ["---", 'layout: "kubernetes"', "---", "", f"# kubernetes_{kind}_{resource_version}", "",
+    "## Argument Reference", "", "The following arguments are supported:", "",
+    "* `metadata` - (Required) Standard metadata of the resource.",
+    "* `spec` - (Required) Spec defines the behavior of the resource.", "", "## Nested Blocks", ""]
+  for name, children in sections:
+    lines += [f"### `{name}`", "", "#### Arguments", ""]
+    for child in children:
+      lines.append(f"* `{child}` - (Optional) The {child.replace('_', ' ')} of the {name}.")
+    lines.append("")
+  return "\n".join(lines)
+
+# Purpose:
+#   This generates a synthetic k8s manifest for benchmarking the translation stages.
+# params:
+#    documents: the number of "---" separated Deployment documents in the manifest
+#    containers: the number of containers in each pod template
+#    env_blocks: the number of env blocks in each container (each holds env_vars variables)
+#    env_vars: the number of variables in each env block
+#    depth: how deeply the custom annotation map of each document is nested
+# returns :
+#    a list of the manifest's lines
+
+def generate_manifest(documents=1, containers=2, env_blocks=1, env_vars=5, depth=4):
+  lines = []
+  for document in range(documents):
+    if document > 0:
+      lines.append("---\n")
+    lines += ["apiVersion: apps/v1\n", "kind: Deployment\n", "metadata:\n", f"  name: example_{document}\n",
+      "  namespace: example_namespace\n", "  annotations:\n"]
+    for level in range(depth):
+      lines.append("    " + "  " * level + f"level_{level}:\n")
+    lines.append("    " + "  " * depth + "value: deep\n")
+    lines += ["spec:\n", "  replicas: 2\n", "  selector:\n", "    matchLabels:\n", f"      app: example_{document}\n",
+      "  template:\n", "    metadata:\n", "      labels:\n", f"        app: example_{document}\n", "    spec:\n",
+      "      containers:\n"]
+    for container in range(containers):
+      lines += [f"        - name: container_{container}\n", "          image: example_image\n",
+        "          imagePullPolicy: Always\n"]
+      for env_block in range(env_blocks):
+        lines.append("          env:\n")
+        for variable in range(env_vars):
+          lines += [f"            - name: VARIABLE_{env_block}_{variable}\n", f"              value: value {variable}\n"]
+      lines += ["          ports:\n", "            - name: http\n", "              containerPort: 8080\n"]
+  return lines
+
+# forgets everything main.py keeps between calls so each benchmark round starts cold
+def reset_main_state():
+  main.provider_docs_index.clear()
+  main.indexed_provider_versions.clear()
+  main.recent_provider_version = None
+  main.attribute_trees.clear()
+  main.match_cache.clear()
+  main.to_snake_case.cache_clear()
+
+# Purpose:
+#   These are the stages that get timed. Each one takes the shared state dict, stores what the next stage needs in
+#   it and returns the number of lines it processed.
+
+def stage_provider_doc_fetch(state):
+  main.get_recent_provider_version(main.SCRAPE_URL_1)
+  provider_docs_index = main.get_provider_docs_catalogue(main.WORKING_PROVIDER_VERSION)
+  state["pages"] = {}
+  for kind, resource_version in state["resources"]:
+    k8s_hashicorp_document = main.parse_recent_versions(provider_docs_index, kind, resource_version)
+    page = main.http_get(f'https://registry.terraform.io{k8s_hashicorp_document["links"]["self"]}').json()
+    state["pages"][(kind, resource_version)] = (main.resource_slug(k8s_hashicorp_document),
+      page["data"]["attributes"]["content"].split("\n"))
+  return sum(len(lines) for _, lines in state["pages"].values())
+
+def stage_markdown_parse(state):
+  state["concise_data"] = {resource: (slug, main.build_concise_data(main.parse_doc_sections(lines), slug))
+    for resource, (slug, lines) in state["pages"].items()}
+  return sum(len(lines) for _, lines in state["pages"].values())
+
+def stage_linking(state):
+  state["trees"] = {resource: main.link_sections(concise_data, slug)
+    for resource, (slug, concise_data) in state["concise_data"].items()}
+  return sum(len(concise_data) for _, concise_data in state["concise_data"].values())
+
+def stage_pre_process(state):
+  state["pre_processed"] = list(main.pre_process(iter(state["manifest"])))
+  return len(state["manifest"])
+
+def stage_terra_translate(state):
+  trees = state["trees"]
+  state["output"] = list(main.translate_documents(state["pre_processed"], lambda kind, version: trees[(kind, version)]))
+  return len(state["pre_processed"])
+
+def stage_file_emit(state):
+  with tempfile.TemporaryFile("w") as tf_file:
+    for text in state["output"]:
+      tf_file.write(text + "\n")
+  return len(state["output"])
+
+STAGES = [
+  ("provider_doc_fetch", stage_provider_doc_fetch),
+  ("markdown_parse", stage_markdown_parse),
+  ("linking", stage_linking),
+  ("pre_process", stage_pre_process),
+  ("terra_translate", stage_terra_translate),
+  ("file_emit", stage_file_emit),
+]
+
+# Purpose:
+#   This runs every stage `rounds` times against the given session and reports, per stage, the fastest time, the
+#   lines processed per second and the peak memory allocated while the stage ran. Memory is measured in a separate
+#   round so tracemalloc's overhead doesn't skew the timings.
+# returns :
+#    {stage name: {"seconds": ..., "lines": ..., "lines_per_second": ..., "peak_bytes": ...}}
+
+def run_benchmark(session, resources, manifest, rounds=5):
+  main.http_session = session
+  report = {name: {"seconds": None, "lines": 0, "lines_per_second": None, "peak_bytes": None} for name, _ in STAGES}
+  for round_number in range(rounds + 1):
+    measure_memory = round_number == rounds
+    reset_main_state()
+    state = {"resources": resources, "manifest": manifest}
+    if measure_memory:
+      tracemalloc.start()
+    for name, stage in STAGES:
+      if measure_memory:
+        tracemalloc.reset_peak()
+        stage(state)
+        report[name]["peak_bytes"] = tracemalloc.get_traced_memory()[1]
+        continue
+      start = time.perf_counter()
+      lines = stage(state)
+      seconds = time.perf_counter() - start
+      if report[name]["seconds"] is None or seconds < report[name]["seconds"]:
+        report[name]["seconds"] = seconds
+        report[name]["lines"] = lines
+        report[name]["lines_per_second"] = lines / seconds if seconds > 0 else None
+    if measure_memory:
+      tracemalloc.stop()
+  return report
+
+def print_report(report):
+  print(f"{'stage':<20}{'seconds':>12}{'lines':>10}{'lines/sec':>14}{'peak KiB':>12}")
+  for name, result in report.items():
+    lines_per_second = f"{result['lines_per_second']:.0f}" if result["lines_per_second"] else "-"
+    print(f"{name:<20}{result['seconds']:>12.5f}{result['lines']:>10}{lines_per_second:>14}"
+      f"{result['peak_bytes'] / 1024:>12.1f}")
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description="Time each stage of the YAML to .tf translation.")
+  parser.add_argument("--fixtures", default=FIXTURE_FOLDER, help="folder of recorded registry responses")
+  parser.add_argument("--record", action="store_true",
+    help="fetch the resources from the live registry and record the responses into --fixtures first")
+  parser.add_argument("--synthetic", action="store_true",
+    help="use generated registry responses even when recorded fixtures exist")
+  parser.add_argument("--resources", nargs="*", default=DEFAULT_RESOURCES, metavar="KIND/VERSION")
+  parser.add_argument("--extra-sections", type=int, default=0, help="filler sections added to generated docs")
+  parser.add_argument("--documents", type=int, default=20, help="documents in the synthetic manifest")
+  parser.add_argument("--containers", type=int, default=3, help="containers per document")
+  parser.add_argument("--env-blocks", type=int, default=2, help="env blocks per container")
+  parser.add_argument("--env-vars", type=int, default=10, help="variables per env block")
+  parser.add_argument("--depth", type=int, default=6, help="nesting depth of each document's custom annotations")
+  parser.add_argument("--rounds", type=int, default=5, help="timed rounds per stage (the fastest is reported)")
+  parser.add_argument("--json", metavar="PATH", help="also write the report as JSON to PATH ('-' for stdout)")
+  args = parser.parse_args()
+
+  resources = [tuple(resource.split("/", 1)) for resource in args.resources]
+  if args.record:
+    main.http_session = RecordingSession(main.get_http_session(), args.fixtures)
+    reset_main_state()
+    stage_provider_doc_fetch({"resources": resources})
+  if not args.synthetic and os.path.exists(os.path.join(args.fixtures, "index.json")):
+    session = ReplaySession(args.fixtures)
+  else:
+    print("no recorded fixtures found, using generated registry responses", file=sys.stderr)
+    session = SyntheticRegistrySession(resources, args.extra_sections)
+  manifest = generate_manifest(args.documents, args.containers, args.env_blocks, args.env_vars, args.depth)
+  report = run_benchmark(session, resources, manifest, args.rounds)
+  print_report(report)
+  if args.json == "-":
+    json.dump(report, sys.stdout, indent=1)
+  elif args.json:
+    with open(args.json, "w") as report_file:
+      json.dump(report, report_file, indent=1)
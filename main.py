@@ -1,55 +1,223 @@
-import os, shutil, requests, re, json
+import os, sys, io, shutil, requests, re, json, time, tempfile, threading, argparse, mmap, struct, hashlib, select
+from collections import OrderedDict
+from functools import lru_cache
+from contextlib import contextmanager
+from itertools import groupby
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 extra_data_flag = False
 cache_resource_trees = False
+# folder holding one cached attribute tree per provider version, kind and resource version
+cache_directory = "resource_cache"
+# seconds before a cached tree is considered stale and re-scraped (None keeps entries until invalidated)
+cache_ttl_seconds = 7 * 24 * 60 * 60
+
+SCRAPE_URL_1 = "https://registry.terraform.io/v2/providers/hashicorp/kubernetes?include=categories,moved-to,potential-fork-of,provider-versions,top-modules&include=categories%2Cmoved-to%2Cpotential-fork-of%2Cprovider-versions%2Ctop-modules&name=kubernetes&namespace=hashicorp"
+#NOTE: Terraform finally OVERHAULED their documentation to make nested schemas, but this code will need patching to adjust
+WORKING_PROVIDER_VERSION = 53551
+# bump whenever the shape of the scraped trees changes so that older cache entries are ignored
+SCHEMA_CACHE_FORMAT = 3
+# compiled schema bundle to translate from before falling back to the cache/registry (None disables it)
+schema_bundle_path = None
+# the opened schema bundle, loaded on first use
+schema_bundle = None
+# first bytes of every schema bundle file, followed by the bundle format
+SCHEMA_BUNDLE_MAGIC = b"TFSCHEMA"
+# bump whenever the bundle layout changes
+SCHEMA_BUNDLE_FORMAT = 2
+# bits of the flags byte stored for each attribute in a schema bundle
+BUNDLE_NO_CHILDREN = 1
+BUNDLE_HAS_PARENT_SET = 2
+BUNDLE_HAS_PARENT = 4
+BUNDLE_CAN_HAVE_CHILDREN_SET = 8
+BUNDLE_CAN_HAVE_CHILDREN = 16
+BUNDLE_REDIRECT = 32
+
+# matches the boundary between words in a camelCase YAML key
+CAMEL_CASE_PATTERN = re.compile(r"(?<=[a-z])(?=[A-Z])")
+# memo of (id of an attribute's child names, snake_case key) -> (child names, best matching child name)
+match_cache = OrderedDict()
+# most pairings kept in match_cache before the least recently used are dropped
+MATCH_CACHE_SIZE = 65536
+
+# interned tuples of child names, so attributes documenting the same children share one tuple
+interned_child_names = {}
+# shared attributes without children, keyed by (has_parent, can_have_children, is_query)
+interned_leaves = {}
+
+# matches the "---" (and "...") lines that separate the documents of a multi-document YAML
+DOCUMENT_SEPARATOR_PATTERN = re.compile(r"(---|\.\.\.)(\s|$)")
+
+# matches the ": " that ends a key, including a key at the very end of the text (a last line without a newline)
+KEY_SEPARATOR_PATTERN = re.compile(r":(?:\s+|$)")
+
+# matches the lines that open a YAML env block
+ENV_BLOCK_PATTERN = re.compile(r"\s+env:.*")
+
+# provider docs indexed by (slug without "kubernetes_" prefix, provider version, category), filled once per run
+provider_docs_index = {}
+# provider versions whose docs have already been downloaded into provider_docs_index
+indexed_provider_versions = set()
+# newest provider version listed by the registry, looked up at most once per run
+recent_provider_version = None
+# guards provider_docs_index and indexed_provider_versions when schemas are being prefetched from several threads
+registry_lock = threading.Lock()
+# held while the provider listing is downloaded, so threads that start together wait for one download
+provider_listing_lock = threading.Lock()
+# provider version -> lock held while its docs are downloaded and indexed, for the same reason
+provider_docs_locks = {}
+# attribute trees already acquired this run, keyed by (provider version, kind, resource version)
+attribute_trees = {}
+
+# keep the output folder between runs and only re-translate YAMLs whose inputs changed
+incremental_translation = False
+# file within the output folder recording what each generated .tf file was translated from
+TRANSLATION_MANIFEST_NAME = ".translation_manifest.json"
+# bump whenever a change to the translator changes the .tf files it writes, so incremental runs redo every file
+TRANSLATOR_VERSION = 2
+# seconds of quiet the watch mode waits for after a change, so a burst of saves is translated once
+watch_debounce_seconds = 0.1
+# seconds between directory scans when the watch mode can't use inotify
+watch_poll_seconds = 0.25
+
+# number of resource schemas downloaded at the same time before translation starts
+prefetch_workers = 8
+# number of processes translating YAML files at the same time (1 translates them one after another)
+translation_workers = 1
+# seconds to wait on a single registry response before retrying
+HTTP_TIMEOUT_SECONDS = 30
+# one keep-alive session shared by every registry request in the run, created on first use
+http_session = None
 
 # function to help with debugging
 def print_array(arr):
   for element in arr:
     print(element.strip() if isinstance(element, str) else element)
 
+# Purpose:
+#   This collects the counters and timers of a run (HTTP requests, doc parsing, linking, translation, file writes and
+#   cache hits/misses) so slow runs and pathological manifests can be tracked down. Counters are always kept, apart from
+#   the per-line ones (translate.* and cache.match.*), which like the per-line timers only run while the metrics are
+#   enabled since they are paid on every YAML line.
+#   Worker processes collect their own metrics, which are merged back in with merge().
+
+class RunMetrics:
+  def __init__(self):
+    self.lock = threading.Lock()
+    self.enabled = False
+    self.reset()
+
+  def reset(self):
+    with self.lock:
+      self.counters = {}
+      # name -> [calls, total seconds, slowest call]
+      self.timers = {}
+      # file name -> {"seconds": ..., "output_lines": ..., "error": ...}
+      self.files = {}
+
+  def count(self, name, amount=1):
+    with self.lock:
+      self.counters[name] = self.counters.get(name, 0) + amount
+
+  def add_time(self, name, seconds, calls=1):
+    with self.lock:
+      timer = self.timers.setdefault(name, [0, 0.0, 0.0])
+      timer[0] += calls
+      timer[1] += seconds
+      timer[2] = max(timer[2], seconds)
+
+  # times the body of a with block under the given name
+  @contextmanager
+  def timer(self, name):
+    start = time.perf_counter()
+    try:
+      yield
+    finally:
+      self.add_time(name, time.perf_counter() - start)
+
+  # passes an iterable through while timing how long each item takes to produce
+  def timed_iter(self, name, iterable):
+    iterator = iter(iterable)
+    while True:
+      start = time.perf_counter()
+      try:
+        item = next(iterator)
+      except StopIteration:
+        self.add_time(name, time.perf_counter() - start, calls=0)
+        return
+      self.add_time(name, time.perf_counter() - start)
+      yield item
+
+  def record_file(self, file_name, seconds, output_lines, error=None, document_errors=()):
+    with self.lock:
+      self.files[file_name] = {"seconds": seconds, "output_lines": output_lines, "error": error,
+        "document_errors": [{"document": document, "error": document_error} for document, document_error in document_errors]}
+
+  def snapshot(self):
+    with self.lock:
+      return {
+        "counters": dict(self.counters),
+        "timers": {name: {"calls": calls, "seconds": seconds, "max_seconds": slowest}
+          for name, (calls, seconds, slowest) in self.timers.items()},
+        "files": dict(self.files),
+      }
+
+  def merge(self, snapshot):
+    for name, amount in snapshot["counters"].items():
+      self.count(name, amount)
+    with self.lock:
+      for name, timer in snapshot["timers"].items():
+        merged = self.timers.setdefault(name, [0, 0.0, 0.0])
+        merged[0] += timer["calls"]
+        merged[1] += timer["seconds"]
+        merged[2] = max(merged[2], timer["max_seconds"])
+      self.files.update(snapshot["files"])
+
+# counters and timers for the current run
+metrics = RunMetrics()
+
+
+# converts YAML camelCase keys into Terraform's snake_case. The same keys appear in every file, so results are cached
+@lru_cache(maxsize=4096)
+def to_snake_case(k8s_key):
+  if CAMEL_CASE_PATTERN.search(k8s_key) is not None:
+    return CAMEL_CASE_PATTERN.sub('_', k8s_key).lower()
+  return k8s_key
 
 # Purpose:
-#   This function is designed to translate a single key value pair from a line in a k8s yaml into a corresponding
-#   .tf format 
+#   This scores every child of an attribute against a k8s key and picks the best one. Results are memoized per
+#   (child names, key) in match_cache, so each pairing is only scored once across all of the files in a run. Child
+#   names are interned (see AttributeNode), so attributes with the same children share their cached matches.
 # params:
-#  KV_pair: this is an array that holds they k8s Key and the value assigned to it in the YAML file. For items with sub
-#       attributes, this will hold ["key"]. For maps, it wil be ["key {"] with varied number of spaces
-#  attribute_tree: this is a dictionary tree that stores the attribute and sub attribute mappings
-#  tree_log: this is a stack holding the attributes which have been accessed recently so that we can quickly index
-#       through the attribute_tree
+#    children: the child names of the attribute in the attribute_tree that is currently being translated
+#    snake_case_k8s_key: the YAML key after it was converted to snake_case
 # returns :
-#   an array of strings with ['TERRAFORM_NAME', 'formatted Terraform line']
+#    the name of the best matching child, or '' when no child matches
 
-def terra_translate(KV_pair, attribute_tree, tree_log):
-  # Sometimes there are multi-level custom fields that require placeholders in tree_log for formatting.
-  # These will never have a match within the attribute_tree.
-  skip_rating = False
-  best_match = ''
-  best_rating = 0
+def find_best_match(children, snake_case_k8s_key):
+  cache_key = (id(children), snake_case_k8s_key)
+  cached = match_cache.get(cache_key)
+  # the child names are stored alongside the result so a recycled id() can never return a stale match
+  if cached is not None and cached[0] is children:
+    match_cache.move_to_end(cache_key)
+    if metrics.enabled:
+      metrics.count("cache.match.hits")
+    return cached[1]
+  if metrics.enabled:
+    metrics.count("cache.match.misses")
 
-  snake_case_k8s_key = KV_pair[0]
-  #YAML camelCase into Terraform's snake_case
-  if re.search(r"(?<=[a-z])(?=[A-Z])", KV_pair[0]) is not None:
-    snake_case_k8s_key = re.sub(r'(?<=[a-z])(?=[A-Z])', '_', KV_pair[0]).lower()
-
-  #find the dictionary entry for the current k8s attribute
-  this_attribute = attribute_tree[list(attribute_tree.keys())[0]]
-  # use logged path to navigate dictionary tree to the current branch 
-  for branch in tree_log:
-    #some stack entries are for custom pieces not in the attribute dictionary
-    if branch == "custom_field_placeholder":
-      skip_rating = True
-      break
-    if this_attribute['children'] is None:
-      break
-    this_attribute = this_attribute['children'][branch]
-  # evaluate each child for a matching score and find the best.
-  if this_attribute['children'] is not None and not skip_rating:
-    for child in this_attribute['children']:
+  best_match = ''
+  if snake_case_k8s_key in children:
+    # an exact name scores higher than any partial match can, no need to rate every child
+    best_match = snake_case_k8s_key
+  else:
+    # evaluate each child for a matching score and find the best.
+    best_rating = 0
+    for terra_key in children:
       rating = 0
-      terra_key = child
-      
+
       if snake_case_k8s_key in terra_key:
         # bonus for a matching
         rating += 20
@@ -66,9 +234,274 @@ def terra_translate(KV_pair, attribute_tree, tree_log):
           best_match = terra_key
           best_rating = rating
 
+  match_cache[cache_key] = (children, best_match)
+  if len(match_cache) > MATCH_CACHE_SIZE:
+    # drop the least recently used pairing
+    match_cache.popitem(last=False)
+  return best_match
+
+# Purpose:
+#   This is a single attribute of a linked attribute tree. Children are kept as two parallel tuples in document order
+#   (names and attribute nodes) instead of a dict per attribute, names are interned and identical leaves are one
+#   shared object. An attribute documented once but linked under several parents is one node referenced by each of
+#   them, so a tree is really a graph of shared nodes (which can loop back onto itself).
+#   Nodes are built from the dicts that link_sections() works on with compact_attribute_tree() and are not changed
+#   afterwards, apart from redirects being resolved (see resolve_redirect()). export_attribute_tree() turns them
+#   back into the dict form.
+# params:
+#    names: a tuple of child names, or None when the attribute has no children
+#    nodes: a tuple of child nodes matching names
+#    has_parent / can_have_children: the linking flags of the dict form, None when they were never set
+#    redirect: "kind/resource_version#section" of the resource doc that documents this attribute's children, None
+#       when they are documented locally (or the redirect has been resolved)
+
+class AttributeNode:
+  __slots__ = ("names", "nodes", "has_parent", "can_have_children", "redirect")
+
+  def __init__(self, names=None, nodes=(), has_parent=None, can_have_children=None, redirect=None):
+    self.names = names
+    self.nodes = nodes
+    self.has_parent = has_parent
+    self.can_have_children = can_have_children
+    self.redirect = redirect
+
+  # returns the child attribute with the given name
+  def child(self, name):
+    return self.nodes[self.names.index(name)]
+
+  def items(self):
+    return zip(self.names or (), self.nodes)
+
+# returns the interned tuple holding these child names
+def intern_child_names(names):
+  names = tuple(sys.intern(name) for name in names)
+  return interned_child_names.setdefault(names, names)
+
+# Purpose:
+#   These convert an attribute tree between the dict form ({'children': {...} or None, 'has_parent': ...,
+#   'can_have_children': ...}) and AttributeNodes. Both keep track of every attribute they have converted, so a dict
+#   shared between several parents becomes one shared node and the other way around, and loops stay loops.
+# params:
+#    attribute_tree: {slug: attribute} in the form being converted from
+# returns :
+#    {slug: attribute} in the other form
+
+def compact_attribute_tree(attribute_tree):
+  converted = {}
+  def compact(attribute):
+    node = converted.get(id(attribute))
+    if node is not None:
+      return node
+    flags = (attribute.get('has_parent'), attribute.get('can_have_children'))
+    children = attribute['children']
+    if attribute.get('redirect') is not None:
+      # redirects are resolved in place later on, so they are never shared with other leaves
+      node = AttributeNode(None if children is None else (), (), *flags, attribute['redirect'])
+      converted[id(attribute)] = node
+      return node
+    if not children:
+      # leaves (and queries without documented children) are identical apart from their flags, share one of each
+      key = flags + (children is not None,)
+      node = interned_leaves.get(key)
+      if node is None:
+        node = interned_leaves.setdefault(key, AttributeNode(None if children is None else (), (), *flags))
+      converted[id(attribute)] = node
+      return node
+    node = AttributeNode(None, (), *flags)
+    converted[id(attribute)] = node
+    node.nodes = tuple(compact(child) for child in children.values())
+    node.names = intern_child_names(children)
+    return node
+  return {sys.intern(slug): compact(root) for slug, root in attribute_tree.items()}
+
+def export_attribute_tree(attribute_tree):
+  exported = {}
+  def export(node):
+    attribute = exported.get(id(node))
+    if attribute is not None:
+      return attribute
+    attribute = {'children': None if node.names is None else {}}
+    if node.has_parent is not None:
+      attribute['has_parent'] = node.has_parent
+    if node.can_have_children is not None:
+      attribute['can_have_children'] = node.can_have_children
+    if node.redirect is not None:
+      attribute['redirect'] = node.redirect
+    exported[id(node)] = attribute
+    for name, child in node.items():
+      attribute['children'][name] = export(child)
+    return attribute
+  return {slug: export(root) for slug, root in attribute_tree.items()}
+
+# returns every distinct attribute reachable from root, numbered breadth first with root as 0, and their numbers
+# keyed by id(). Attributes shared between several parents (or looping back to an ancestor) are numbered once.
+def number_attribute_nodes(root):
+  nodes = [root]
+  node_numbers = {id(root): 0}
+  index = 0
+  while index < len(nodes):
+    for _, child in nodes[index].items():
+      if id(child) not in node_numbers:
+        node_numbers[id(child)] = len(nodes)
+        nodes.append(child)
+    index += 1
+  return nodes, node_numbers
+
+# Purpose:
+#   These convert an attribute tree to and from a table of numbered attributes that can be written as JSON. Children
+#   refer to attributes by number, so shared attributes and loops survive the round trip.
+#   Table layout: {"root": slug, "nodes": [{"children": [[name, number], ...] or None, "has_parent": ...,
+#   "can_have_children": ..., "redirect": ...}, ...]} where the flags are left out when they aren't set.
+# params:
+#    attribute_tree: {slug: AttributeNode}, or a table
+# returns :
+#    the table, or {slug: AttributeNode}
+
+def attribute_tree_to_table(attribute_tree):
+  slug = next(iter(attribute_tree))
+  nodes, node_numbers = number_attribute_nodes(attribute_tree[slug])
+  table = []
+  for node in nodes:
+    entry = {"children": None if node.names is None else [[name, node_numbers[id(child)]] for name, child in node.items()]}
+    for flag in ("has_parent", "can_have_children", "redirect"):
+      if getattr(node, flag) is not None:
+        entry[flag] = getattr(node, flag)
+    table.append(entry)
+  return {"root": slug, "nodes": table}
+
+def attribute_tree_from_table(table):
+  nodes = [AttributeNode() for _ in table["nodes"]]
+  for node, entry in zip(nodes, table["nodes"]):
+    if entry["children"] is not None:
+      node.names = intern_child_names(name for name, _ in entry["children"])
+      node.nodes = tuple(nodes[number] for _, number in entry["children"])
+    node.has_parent = entry.get("has_parent")
+    node.can_have_children = entry.get("can_have_children")
+    node.redirect = entry.get("redirect")
+  return {sys.intern(table["root"]): nodes[0]}
+
+# Purpose:
+#   This links an attribute whose children are documented on another resource's page (ie: "see ... for reference")
+#   to the children documented there. It only runs once a YAML descends into the attribute: the other resource's tree
+#   is acquired through resolve_tree (so it is fetched at most once and shared between files), and the attribute is
+#   updated in place so every tree holding it sees the resolved children from then on. The redirect is only cleared
+#   once it has been resolved: a registry error is raised (failing the file, like a failed schema for the file's own
+#   kind) and a redirect to a doc that doesn't exist leaves the attribute without children for this descent, like
+#   it was before redirects were followed.
+# params:
+#    attribute: the AttributeNode holding the redirect
+#    resolve_tree: a function taking (kind, resource_version) and returning the resource's attribute tree
+#    default_resource_version: the version used when the redirect doesn't name one
+# returns :
+#    the attribute
+
+def resolve_redirect(attribute, resolve_tree, default_resource_version=None):
+  if attribute.redirect is None:
+    return attribute
+  target, _, section = attribute.redirect.partition("#")
+  kind, _, resource_version = target.partition("/")
+  try:
+    referenced_tree = resolve_tree(kind, resource_version or default_resource_version)
+  except OSError:
+    # requests' errors are OSErrors, the redirect is tried again when the file is translated again
+    metrics.count("redirect.failures")
+    raise
+  except Exception:
+    metrics.count("redirect.failures")
+    return attribute
+  referenced = referenced_tree[next(iter(referenced_tree))]
+  # anchors such as "#spec" point at one attribute of the referenced resource, others (ie: "#argument-reference")
+  # at the resource itself
+  section = section.replace("-", "_")
+  if section and referenced.names is not None and section in referenced.names:
+    referenced = referenced.child(section)
+  if referenced.names is None:
+    metrics.count("redirect.failures")
+    return attribute
+  attribute.nodes = referenced.nodes
+  attribute.names = referenced.names
+  attribute.redirect = None
+  metrics.count("redirect.resolved")
+  return attribute
+
+# Purpose:
+#   This keeps track of where the translation is within an attribute tree. It holds the attribute reached after each
+#   branch taken, so the current attribute is available without walking down from the root on every line. Pushes and
+#   pops follow the indents of the YAML being translated.
+# params:
+#    attribute_tree: the tree of AttributeNodes that stores the attribute and sub attribute mappings
+#    resolve_tree: a function taking (kind, resource_version) and returning the resource's attribute tree, used to
+#       follow redirects to other resources. None leaves redirects alone.
+#    resource_version: the version of the resource being translated, used for redirects that don't name one
+
+class TreeCursor:
+  def __init__(self, attribute_tree, resolve_tree=None, resource_version=None):
+    self.resolve_tree = resolve_tree
+    self.resource_version = resource_version
+    # (attribute, skip_rating, stopped) reached after each branch taken, starting with the root
+    self.stack = [(attribute_tree[next(iter(attribute_tree))], False, False)]
+
+  # returns (attribute, skip_rating) for the attribute currently being translated
+  def current(self):
+    return self.stack[-1][:2]
+
+  def push(self, branch):
+    this_attribute, skip_rating, stopped = self.stack[-1]
+    if skip_rating or stopped:
+      # anything below a placeholder or an attribute without children stays where it is
+      self.stack.append(self.stack[-1])
+    elif branch == "custom_field_placeholder":
+      #some stack entries are for custom pieces not in the attribute dictionary
+      self.stack.append((this_attribute, True, False))
+    elif this_attribute.names is None:
+      self.stack.append((this_attribute, False, True))
+    else:
+      self.stack.append((this_attribute.child(branch), False, False))
+
+  def pop(self):
+    self.stack.pop()
+
+  # follows the redirect of an attribute the translation is about to descend into, see resolve_redirect()
+  def resolve(self, attribute):
+    if attribute.redirect is not None and self.resolve_tree is not None:
+      resolve_redirect(attribute, self.resolve_tree, self.resource_version)
+    return attribute
+
+# Purpose:
+#   This function is designed to translate a single key value pair from a line in a k8s yaml into a corresponding
+#   .tf format 
+# params:
+#  KV_pair: this is an array that holds they k8s Key and the value assigned to it in the YAML file. For items with sub
+#       attributes, this will hold ["key"]. For maps, it wil be ["key {"] with varied number of spaces
+#  cursor: a TreeCursor that holds the attribute tree and the path to the attribute currently being translated.
+#       Matched attributes are pushed onto it.
+# returns :
+#   an array of strings with ['TERRAFORM_NAME', 'formatted Terraform line']
+
+def terra_translate(KV_pair, cursor):
+  best_match = ''
+  if metrics.enabled:
+    metrics.count("translate.calls")
+
+  #YAML camelCase into Terraform's snake_case
+  snake_case_k8s_key = to_snake_case(KV_pair[0])
+
+  #find the dictionary entry for the current k8s attribute
+  # Sometimes there are multi-level custom fields that require placeholders on the cursor for formatting.
+  # These will never have a match within the attribute_tree, so rating gets skipped below them.
+  this_attribute, skip_rating = cursor.current()
+  # find the child with the best matching score.
+  if this_attribute.names is not None and not skip_rating:
+    best_match = find_best_match(this_attribute.names, snake_case_k8s_key)
+  if best_match != '' and KV_pair[1] == '':
+    # attributes documented on another resource's page are only linked in once a YAML descends into them
+    cursor.resolve(this_attribute.child(best_match))
+
   # decide if the entry should be KV entry or a mapping.
   formatted = None
   if best_match == '':
+    if metrics.enabled:
+      metrics.count("translate.unmatched_keys")
     if re.match(r"[\[\]]+", KV_pair[1]) is not None:
       formatted = formatted = f'{snake_case_k8s_key} = {KV_pair[1]}'
     elif KV_pair[1] != '':
@@ -76,15 +509,17 @@ def terra_translate(KV_pair, attribute_tree, tree_log):
       formatted = f'{snake_case_k8s_key} = "{pre_process_quotes}"'
     elif KV_pair[1] == '':
       formatted = f'{snake_case_k8s_key} = '
-      tree_log.append("custom_field_placeholder")
-  elif this_attribute['children'][best_match]['children'] is None:
+      if metrics.enabled:
+        metrics.count("translate.placeholder_fallbacks")
+      cursor.push("custom_field_placeholder")
+  elif this_attribute.child(best_match).names is None:
     #best match has no dictionary children
     if re.match(r"[\[\]]+", KV_pair[1]) is not None:
       formatted = formatted = f'{snake_case_k8s_key} = {KV_pair[1]}'
     elif KV_pair[1] == '':
       # this attribute is likely a custom mapping that will not be documented. such as custom labels
       formatted = f'{best_match} = '
-      tree_log.append(best_match)
+      cursor.push(best_match)
     else:
       #no children and it has a value. IE: it is a KV entry
       pre_process_quotes = KV_pair[1].replace('"',"'")
@@ -93,394 +528,1557 @@ def terra_translate(KV_pair, attribute_tree, tree_log):
   else:
     # the best match has children and thus is a mapping
     formatted = f'{best_match}'
-    tree_log.append(best_match)
+    cursor.push(best_match)
       
   return [best_match, formatted]
 
+# Purpose:
+#   This performs a GET request against the registry over the shared keep-alive session. The session keeps up to
+#   prefetch_workers connections open and retries failed requests with an exponential backoff.
+# params:
+#    url: the full URL to request
+# returns :
+#    the requests response, raising for error statuses that persist after the retries
+
+def http_get(url):
+  start = time.perf_counter()
+  response = get_http_session().get(url, timeout=HTTP_TIMEOUT_SECONDS)
+  metrics.add_time("http.latency", time.perf_counter() - start)
+  metrics.count("http.requests")
+  metrics.count("http.bytes", len(response.content))
+  response.raise_for_status()
+  return response
+
+# returns the shared registry session, creating it on first use
+def get_http_session():
+  global http_session
+  with registry_lock:
+    if http_session is None:
+      retries = Retry(total=5, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504), allowed_methods=("GET",))
+      adapter = HTTPAdapter(pool_connections=prefetch_workers, pool_maxsize=prefetch_workers, max_retries=retries)
+      http_session = requests.Session()
+      http_session.mount("https://", adapter)
+      http_session.mount("http://", adapter)
+  return http_session
+
+# Purpose:
+#   This looks up the newest kubernetes provider version listed in the registry. It isn't used for scraping yet
+#   (see WORKING_PROVIDER_VERSION) but is kept for when the scraper moves onto the new docs. The listing is only
+#   downloaded once per run.
+# params:
+#    URL: this is the top level URL that holds references to all provider versions of Terraform's documentation page
+# returns :
+#    the id of the most recent provider version
+
+def get_recent_provider_version(URL):
+  global recent_provider_version
+  with provider_listing_lock:
+    if recent_provider_version is None:
+      provider_versions = http_get(URL).json()["data"]["relationships"]["provider-versions"]["data"]
+      recent_provider_version = provider_versions[-1]["id"]
+  return recent_provider_version
+
+# Purpose:
+#   This downloads the list of provider docs for a provider version and indexes it so that each resource's document
+#   can be found without scanning the whole list. Every provider version is only downloaded once per run and the
+#   index is shared by every YAML file that gets translated.
+# params:
+#    provider_version: the id of the provider version whose docs should be indexed
+# returns :
+#    the shared provider_docs_index, which maps (slug without "kubernetes_" prefix, provider version, category)
+#    to the matching provider doc
+
+def get_provider_docs_catalogue(provider_version):
+  with registry_lock:
+    if provider_version in indexed_provider_versions:
+      return provider_docs_index
+    provider_docs_lock = provider_docs_locks.setdefault(provider_version, threading.Lock())
+  # threads that get here while another one is downloading wait for it and then find the version indexed
+  with provider_docs_lock:
+    if provider_version in indexed_provider_versions:
+      return provider_docs_index
+    provider_info = http_get(
+      f"https://registry.terraform.io/v2/provider-versions/{provider_version}?include=provider-docs")  # %2Chas-cdktf-docs on the end?
+    with registry_lock:
+      for doc in provider_info.json()["included"]:
+        slug = doc["attributes"]["slug"]
+        if slug.startswith("kubernetes_"):
+          slug = slug[len("kubernetes_"):]
+        # keep the first doc listed for a key, just like the old linear scan did
+        provider_docs_index.setdefault((slug, provider_version, doc["attributes"]["category"]), doc)
+      indexed_provider_versions.add(provider_version)
+  return provider_docs_index
+
 # Purpose:
 #   This meant to find the relevant provider doc data entry so it can be used to obtain the raw data
 #   that is used to render terraform's hashicorp documentation for K8s resources
 # params:
-#    provider docs: a list of all kubernetes provider resource document info that is used to dynamically load documentation.
-#       These JSON objects hold relative links/slugs to documententation for each k8s resource.
+#    provider_docs_index: the index built by get_provider_docs_catalogue(). The provider docs it holds are JSON
+#       objects with relative links/slugs to documententation for each k8s resource.
 #    resource: 
 #       The name of the K8s resource that was sourced from the list of provided k8s YAMLS
+#    resource_version: the version the user has made their k8s resource (ie: v1)
+#    provider_version: the provider version the docs were indexed under
 # returns :
-#    k8s_hashicorp_document - one of the provider_docs param that matches the provided resource param
-
-def parse_recent_versions(provider_docs, resource, resource_version):
-  # for every terraform document found for kubernetes
-  k8s_hashicorp_document = None
-  for doc in provider_docs:
-    doc_name = doc["attributes"]["slug"]
-    if doc_name.replace("kubernetes_","") != f"{resource}_{resource_version}" or doc["attributes"]["category"] != "resources":
-      continue
-    else:
-      if resource_version in doc_name:
-        k8s_hashicorp_document = doc
-        break
-    
-  # cleanup by removing version numbers
-  k8s_hashicorp_document["attributes"]["slug"] = k8s_hashicorp_document["attributes"]["slug"].split("_v")[0]
+#    k8s_hashicorp_document - the provider doc that matches the provided resource param. The shared doc is returned
+#    as is, use resource_slug() for its name without the version number.
 
+def parse_recent_versions(provider_docs_index, resource, resource_version, provider_version=WORKING_PROVIDER_VERSION):
+  k8s_hashicorp_document = provider_docs_index.get((f"{resource}_{resource_version}", provider_version, "resources"))
+  if k8s_hashicorp_document is None:
+    raise ValueError(f"no terraform resource doc found for {resource} {resource_version}")
   return k8s_hashicorp_document
 
+# cleanup by removing version numbers (ie: kubernetes_deployment_v1 -> kubernetes_deployment)
+def resource_slug(k8s_hashicorp_document):
+  return k8s_hashicorp_document["attributes"]["slug"].split("_v")[0]
+
+# markdown patterns used to classify the lines of a resource doc, compiled once
+DOC_THE_FOLLOWING_PATTERN = re.compile(r".*[tT]he following.*:")
+DOC_ARGUMENT_REFERENCE_PATTERN = re.compile(r"[aA]rgument [Rr]eference")
+DOC_BULLET_OR_CODE_FENCE_PATTERN = re.compile(r"^\*|```")
+DOC_SECTION_HEADER_PATTERN = re.compile(r'(###\s)(.*\`.*\`)')
+DOC_MULTI_BLOCK_PATTERN = re.compile(r'([a-zA-Z_ ]*)([^a-zA-Z_]*)([a-zA-Z _]*)')
+DOC_CHILD_PATTERN = re.compile(r'(\*\s\`)(.*?)(\`)')
+DOC_EXPLICIT_TYPE_PATTERN = re.compile(r"(is\san*)(\s+[A-Za-z]*\s*)([sS]tring|[iI]nt|[Nn]umber|[nN]ame)+")
+DOC_NAME_OR_NUMBER_OF_PATTERN = re.compile(r"[nN]ame of|[nN]umber of")
+DOC_REDIRECT_PATTERN = re.compile(r"see .* for reference")
+# the doc a redirect points at, either a markdown link (ie: [docs](persistent_volume_claim.html#spec)) or a resource
+# name (ie: `kubernetes_persistent_volume_claim_v1`)
+DOC_REDIRECT_LINK_PATTERN = re.compile(r"\]\((?![^)]*://)(?:[^)#]*/)?([a-z_]+?)(?:_(v\d+))?(?:\.html)?(?:\.markdown)?(?:#([\w-]+))?\)")
+DOC_REDIRECT_NAME_PATTERN = re.compile(r"kubernetes_([a-z_]+?)(?:_(v\d+))?\b")
+
+# returns the "kind[/resource_version][#section]" a redirect points at, or None when no other doc is named. Links are
+# only taken from the "see ... for reference" part so links to the kubernetes docs aren't mistaken for resources
+def parse_redirect_target(text, redirect):
+  target = DOC_REDIRECT_LINK_PATTERN.search(redirect.group(0)) or DOC_REDIRECT_NAME_PATTERN.search(text)
+  if target is None:
+    return None
+  kind, resource_version = target.group(1, 2)
+  section = target.group(3) if target.re is DOC_REDIRECT_LINK_PATTERN else None
+  return kind + (f"/{resource_version}" if resource_version else "") + (f"#{section}" if section else "")
+
 # Purpose:
-#   This function is designed to scrape a resource doc from Terraform's page and format it into a hierarchial Tree 
-#   of Terraform's Kubernetes attributes that can be used to translate between K8s and Terraform. 
+#   This reads the markdown of a resource doc one line at a time and hands out a record for each documented section.
+#   Each line is classified once (section header, multi-block header, child bullet, code fence or "the following"
+#   block) and cheap substring checks decide which compiled patterns are worth running on it.
 # params:
-#    URL: this is the top level URL that holds references to all provider versions of Terraform's documentation page
-#    resource: 
-#       The name of the K8s resource that was sourced from the list of provided k8s YAMLS
+#    lines: an iterable of the doc's markdown lines
 # returns :
-#    A dictionary of k8s attributes that are used in .tf files and have been arranged into a hierarchial tree to aid in
-#    contextual interpretation (a pod's 'security_context' is different than a volume_claim_template's 'security_context').
+#    A generator of {"names": [...], "attributes": [(name, is_query, can_have_children, redirect), ...]} in document
+#    order, where redirect is the target of a "see ... for reference" (see parse_redirect_target()) or None.
+#    The first record holds the attributes listed before any section header and has no names (it belongs to the
+#    resource itself). Headers like "a/b" document two sections with the same children, so they have two names.
 
-def scrape(URL, resource, resource_version):
-  provider_versions = requests.get(URL)
-  #NOTE: Terraform finally OVERHAULED their documentation to make nested schemas, but this code will need patching to adjust
-  WORKING_PROVIDER_VERSION = 53551
-  recent_provider_version = provider_versions.json()["data"]["relationships"]["provider-versions"]["data"][-1]["id"]
-  provider_info = requests.get(
-    f"https://registry.terraform.io/v2/provider-versions/{WORKING_PROVIDER_VERSION}?include=provider-docs")  # %2Chas-cdktf-docs on the end?
-  provider_docs = provider_info.json()["included"]
-  k8s_hashicorp_document = parse_recent_versions(provider_docs, resource, resource_version)
-  concise_data = [{k8s_hashicorp_document["attributes"]["slug"]: {'children': {}}}]
-  # keep reference to actual object in stack so that referencing depth isnt an issue
-  json_data = requests.get(f'https://registry.terraform.io{k8s_hashicorp_document["links"]["self"]}').json()
-  page_data = json_data["data"]['attributes']
-  lines = page_data['content'].split('\n')
-  # for when attributes are listed together: 'a' and 'b' have the same children, so there is a section "a/b"
-  double_flag = False
+def parse_doc_sections(lines):
+  section = {"names": [], "attributes": []}
   # for identifying when we have found a "the following" block to be skipped
   skip_the_following_lines = False
   #for identifying when we are actively parsing "The following" block's attributes
   skipping_the_following_body = False
-  # build array of attribute trees to be strung together
-  for index, text in enumerate(lines):
+  # last line holding any text, which decides whether a "the following" block is skipped
+  last_non_blank_line = None
+  for text in lines:
+    is_blank = len(text.strip()) == 0
     # sometimes docs include redundant references to attributes that are formatted the same as their copies
     # this creates weird document parsing that generates incorrect dictionary refrences so we ignore one set
-    if skip_the_following_lines == False and re.search(r".*[tT]he following.*:", text) is not None:
-      # subroutine for identifying if this phrasing is used directly after "argument Reference" header
-      run_loop = True
-      look_back_depth = 1
-      while run_loop:
-        #find last non-whitespace line and check it for arg ref header to determine if it shuold be ignored
-        if len(lines[index - look_back_depth].strip()) > 0 and re.search(r"[aA]rgument [Rr]eference", lines[index - look_back_depth]) is None: # "Argument Reference" not in lines[index - look_back_depth]:
-          skip_the_following_lines = True
-          run_loop = False
-        elif re.search(r"[aA]rgument [Rr]eference", lines[index - look_back_depth]) is not None: # "Argument Reference" in lines[index - look_back_depth]:
-          run_loop = False
-        look_back_depth += 1
-    elif skip_the_following_lines == True:
-      if skipping_the_following_body == False:
-        if len(text.strip()) == 0:
-          continue
-        elif re.search(r"^\*|```", text.lstrip()):
-          skipping_the_following_body = True
-          continue
-      else:
-        if len(text.lstrip()) == 0 or re.search(r"^\*|```", text.lstrip()):
-          skipping_the_following_body = False
-          skip_the_following_lines = False
+    if not skip_the_following_lines:
+      if "he following" in text and DOC_THE_FOLLOWING_PATTERN.search(text) is not None:
+        # only keep the block when it comes directly after the "argument Reference" header
+        skip_the_following_lines = (
+          last_non_blank_line is None or DOC_ARGUMENT_REFERENCE_PATTERN.search(last_non_blank_line) is None)
+    elif not skipping_the_following_body:
+      if not is_blank and DOC_BULLET_OR_CODE_FENCE_PATTERN.search(text.lstrip()):
+        skipping_the_following_body = True
+    elif is_blank or DOC_BULLET_OR_CODE_FENCE_PATTERN.search(text.lstrip()):
+      skipping_the_following_body = False
+      skip_the_following_lines = False
 
+    if not is_blank:
+      last_non_blank_line = text
     if skip_the_following_lines:
       continue
 
     # recognize attribute headers 
-    argument = re.search(fr'(###\s)(.*\`.*\`)', text)
-
+    argument = DOC_SECTION_HEADER_PATTERN.search(text) if "###" in text else None
     if argument is not None:  # found new attribute with children
       # check if object is explicitly not map to avoid erroneous children assignement and circular dependencies
       # NOTE: this only accounts for 2 multiblocks.
-      multi_block = re.search(r'([a-zA-Z_ ]*)([^a-zA-Z_]*)([a-zA-Z _]*)', argument.group(2).replace("`", ""))
-      if multi_block is None or len(multi_block.group(3)) == 0:
-        double_flag = False
-        concise_data.append(
-          {argument.group(2).strip('\'\" ').replace("`", ""): {'children': {}, 'has_parent': False, "can_have_children": True}})
+      multi_block = DOC_MULTI_BLOCK_PATTERN.search(argument.group(2).replace("`", ""))
+      if len(multi_block.group(3)) == 0:
+        names = [argument.group(2).strip('\'\" ').replace("`", "")]
       else:
-        concise_data.append({multi_block.group(1).strip(): {'children': {}, 'has_parent': False, "can_have_children": True}})
-        concise_data.append({multi_block.group(3).strip(): {'children': {}, 'has_parent': False, "can_have_children": True}})
-        double_flag = True
-    
+        names = [multi_block.group(1).strip(), multi_block.group(3).strip()]
+      yield section
+      section = {"names": names, "attributes": []}
+
     # recognize children of attribute header
-    argument = re.search(fr'(\*\s\`)(.*?)(\`)', text)
+    argument = DOC_CHILD_PATTERN.search(text) if "`" in text else None
     if argument is None:
-      continue      
-
+      continue
 
     # NOTE: some number type attributes are not recognized with "[nN]umber of". Most 
     #       are and it's safer to not diqualify these niche cases from having children
     # looks for descriptions holding explicit datatypes that will not result in children'
     attribute_is_mapping = (
-      re.search(r"(is\san*)(\s+[A-Za-z]*\s*)([sS]tring|[iI]nt|[Nn]umber|[nN]ame)+", text) is None 
-      and re.search(r"[nN]ame of|[nN]umber of", text) is None
+      DOC_EXPLICIT_TYPE_PATTERN.search(text) is None
+      and DOC_NAME_OR_NUMBER_OF_PATTERN.search(text) is None
     )
     # looks for references to other resource docs so local attributes arent erroneously assigned
-    attribute_has_no_redirect = re.search( r"see .* for reference", text) is None
+    redirect = DOC_REDIRECT_PATTERN.search(text)
+    attribute_has_no_redirect = redirect is None
     # recognizes selector querys that will need to be written as maps in .tf file
-    attribute_is_query = re.search(r"query", text) is not None
-    res_key = list(concise_data[-1].keys())[0]
-    concise_data[-1][res_key]['children'][argument.group(2)] = {'children': {} if attribute_is_query else None, 'has_parent': True, "can_have_children": attribute_is_mapping and attribute_has_no_redirect}
-    if double_flag:
-      # NOTE: again this assumes only 2 doubles
-      res_key = list(concise_data[-2].keys())[0]
-      concise_data[-2][res_key]['children'][argument.group(2)] = {'children': {} if attribute_is_query else None, 'has_parent': True, "can_have_children": attribute_is_mapping and attribute_has_no_redirect}
-  
+    attribute_is_query = "query" in text
+    section["attributes"].append((argument.group(2), attribute_is_query, attribute_is_mapping and attribute_has_no_redirect,
+      None if redirect is None else parse_redirect_target(text, redirect)))
+  yield section
+
+# Purpose:
+#   This turns the section records from parse_doc_sections() into the list of unlinked sections that
+#   link_sections() strings together.
+# params:
+#    sections: an iterable of section records
+#    slug: the name of the resource doc without its version (ie: kubernetes_deployment)
+#    resource_version: the version of the resource doc, given to redirects that don't name one
+# returns :
+#    a list of {"section name": attribute} with the resource itself first
+
+def build_concise_data(sections, slug, resource_version=None):
+  concise_data = [{slug: {'children': {}}}]
+  for section in sections:
+    if len(section["names"]) == 0:
+      targets = [concise_data[0][slug]]
+    else:
+      targets = []
+      for name in section["names"]:
+        targets.append({'children': {}, 'has_parent': False, "can_have_children": True})
+        concise_data.append({name: targets[-1]})
+    for name, attribute_is_query, can_have_children, redirect in section["attributes"]:
+      if redirect is not None and resource_version is not None and "/" not in redirect.split("#")[0]:
+        kind, _, anchor = redirect.partition("#")
+        redirect = f"{kind}/{resource_version}" + (f"#{anchor}" if anchor else "")
+      for target in targets:
+        target['children'][name] = {'children': {} if attribute_is_query else None, 'has_parent': True, "can_have_children": can_have_children}
+        if redirect is not None:
+          target['children'][name]['redirect'] = redirect
+  return concise_data
+
+# Purpose:
+#   This parses the markdown of a resource doc into an attribute tree. It works on any copy of the doc, so docs
+#   loaded from disk can be parsed the same way as ones scraped from the registry.
+# params:
+#    content: the markdown of the resource doc
+#    slug: the name of the resource doc without its version (ie: kubernetes_deployment)
+#    resource_version: the version of the resource doc (ie: v1), None when unknown
+# returns :
+#    the attribute tree, {slug: attribute}
+
+def parse_resource_doc(content, slug, resource_version=None):
+  with metrics.timer("doc_parse"):
+    concise_data = build_concise_data(parse_doc_sections(content.split('\n')), slug, resource_version)
+  metrics.count("doc_parse.sections", len(concise_data))
+  with metrics.timer("linking"):
+    return link_sections(concise_data, slug)
+
+# Purpose:
+#   This links the sections parsed from a resource doc into a single tree by replacing each attribute that can have
+#   children with the section documenting it. Sections are looked up by name through an index instead of scanning
+#   the whole list for every attribute.
+# params:
+#    concise_data: a list of {"section name": attribute} for each section in the order they appear in the doc. The
+#       first entry is the resource itself.
+#    slug: the name of the resource doc without its version (ie: kubernetes_deployment)
+# returns :
+#    the assembled tree from the first element of concise_data, as AttributeNodes
+
+def link_sections(concise_data, slug):
+  # every section in document order, grouped by name
+  sections_by_name = {}
+  for data in concise_data:
+    data_key = next(iter(data))
+    sections_by_name.setdefault(data_key, []).append(data[data_key])
+
   # first loop finds the repeated naming conventions and linkes them to the proper parent to avoid circular dependancies
   for data in concise_data:
-    data_key = list(data.keys())[0]
+    data_key = next(iter(data))
     #NOTE: this is an anomoly where the attribute "pod security_context" links to "spec" parent instead 
     # of "pod" like every other entry in the docs... (this hardcode skip isn't permanent)
-    if "deployment" in k8s_hashicorp_document["attributes"]["slug"] and "pod security_context" in data_key:
+    if "deployment" in slug and "pod security_context" in data_key:
       continue
     if " " in data_key:
       split_name = data_key.split(" ")
-      parent_object = next((x for x in concise_data if list(x.keys())[0] == split_name[0].lower()), None)
       parent_name = split_name[0].lower()
       child_name = split_name[1].lower()
-
-
-      #NOTE: this will run on every child, but I may improve upon this logic later
-      for i in range(0, len(parent_object[parent_name]['children'])):
-        if child_name in list(parent_object[parent_name]['children'].keys()) and parent_object[parent_name]['children'][child_name]['can_have_children']:
-          parent_object[parent_name]['children'][child_name] = data[data_key]
-          data[data_key]['has_parent'] = True
-          break
-      continue
+      if parent_name not in sections_by_name:
+        continue
+      parent_children = sections_by_name[parent_name][0]['children']
+      if child_name in parent_children and parent_children[child_name]['can_have_children']:
+        parent_children[child_name] = data[data_key]
+        data[data_key]['has_parent'] = True
 
   # second loop goes through each child entry and links it to nearest matching object
   # NOTE: 'parent is none' check ensures that duplicate name atttributes are assigned to their nearest duplicate.
+  # sections only ever gain a parent, so the first unassigned section of each name is tracked with a moving position
+  first_unassigned = {}
   for parent_data in concise_data:
-    parent_data_key = list(parent_data.keys())[0]
-    children_keys = list(parent_data[parent_data_key]['children'].keys())
-    for child_key in children_keys:
+    parent_children = parent_data[next(iter(parent_data))]['children']
+    for child_key in list(parent_children.keys()):
       #skip over children that have already been found
-      if parent_data[parent_data_key]['children'][child_key]['children'] is not None:
+      if parent_children[child_key]['children'] is not None or not parent_children[child_key]['can_have_children']:
         continue
-      for this_data in concise_data:
-        # shouldn't be re-assigning already assigned objects
-        this_data_key = list(this_data.keys())[0]
-        if this_data_key == child_key and this_data[this_data_key]['has_parent'] is False and parent_data[parent_data_key]['children'][child_key]['can_have_children']:
-          parent_data[parent_data_key]['children'][child_key] = this_data[this_data_key]
-          this_data[this_data_key]['has_parent'] = True
-          break
-  
-  # third loop attempts to connect any missing links
+      candidates = sections_by_name.get(child_key)
+      if candidates is None:
+        continue
+      position = first_unassigned.get(child_key, 0)
+      # shouldn't be re-assigning already assigned objects
+      while position < len(candidates) and candidates[position].get('has_parent') is not False:
+        position += 1
+      first_unassigned[child_key] = position
+      if position < len(candidates):
+        parent_children[child_key] = candidates[position]
+        candidates[position]['has_parent'] = True
+
+  # third loop attempts to connect any missing links (to the last section sharing the attribute's name)
   for parent_data in concise_data:
-    parent_data_key = list(parent_data.keys())[0]
-    children_keys = list(parent_data[parent_data_key]['children'].keys())
-    for child_key in children_keys:
-      if parent_data[parent_data_key]['children'][child_key]['children'] is not None or parent_data_key == child_key:
+    parent_data_key = next(iter(parent_data))
+    parent_children = parent_data[parent_data_key]['children']
+    for child_key in list(parent_children.keys()):
+      if parent_children[child_key]['children'] is not None or parent_data_key == child_key:
         #continue if they already have children or trying to link to self
         continue
-      for this_data in concise_data:
-        this_data_key = list(this_data.keys())[0]
-        if this_data_key == child_key and parent_data[parent_data_key]['children'][child_key]['can_have_children']:
-          parent_data[parent_data_key]['children'][child_key] = this_data[this_data_key]
+      if child_key in sections_by_name and parent_children[child_key]['can_have_children']:
+        parent_children[child_key] = sections_by_name[child_key][-1]
+
   # first element should be assembled tree
-  return concise_data[0]
+  return compact_attribute_tree(concise_data[0])
+
+# Purpose:
+#   This function is designed to scrape a resource doc from Terraform's page and format it into a hierarchial Tree 
+#   of Terraform's Kubernetes attributes that can be used to translate between K8s and Terraform. 
+# params:
+#    URL: this is the top level URL that holds references to all provider versions of Terraform's documentation page
+#    resource: 
+#       The name of the K8s resource that was sourced from the list of provided k8s YAMLS
+# returns :
+#    A dictionary of k8s attributes that are used in .tf files and have been arranged into a hierarchial tree to aid in
+#    contextual interpretation (a pod's 'security_context' is different than a volume_claim_template's 'security_context').
+
+def scrape(URL, resource, resource_version):
+  with metrics.timer("scrape"):
+    return scrape_resource_doc(URL, resource, resource_version)
+
+def scrape_resource_doc(URL, resource, resource_version):
+  get_recent_provider_version(URL)
+  provider_docs_index = get_provider_docs_catalogue(WORKING_PROVIDER_VERSION)
+  k8s_hashicorp_document = parse_recent_versions(provider_docs_index, resource, resource_version)
+  slug = resource_slug(k8s_hashicorp_document)
+  json_data = http_get(f'https://registry.terraform.io{k8s_hashicorp_document["links"]["self"]}').json()
+  page_data = json_data["data"]['attributes']
+  return parse_resource_doc(page_data['content'], slug, resource_version)
+
+# Purpose:
+#   This is an on-disk store for the attribute trees produced by scrape(). Each tree lives in its own file keyed by
+#   the provider version, the K8s kind and the resource version, so several processes can share one cache folder
+#   without rewriting each other's entries. Entries are written to a temporary file and atomically renamed into
+#   place, which means readers only ever see a complete file (or no file at all).
+# params:
+#    directory: the folder that holds the cached entries, created on first write
+#    ttl_seconds: how long an entry stays valid after it was written. None disables expiry.
+
+class SchemaCache:
+  def __init__(self, directory, ttl_seconds=None):
+    self.directory = directory
+    self.ttl_seconds = ttl_seconds
+
+  # returns the path of the file holding a single cached tree
+  def entry_path(self, provider_version, kind, resource_version):
+    file_name = re.sub(r"[^\w.-]", "_", f"{kind}_{resource_version}") + ".json"
+    return os.path.join(self.directory, str(provider_version), file_name)
+
+  # returns the cached attribute tree, or None when it is missing, stale, unreadable or from an older format
+  def load(self, provider_version, kind, resource_version):
+    try:
+      with open(self.entry_path(provider_version, kind, resource_version)) as cache_file:
+        entry = json.load(cache_file)
+    except (OSError, ValueError):
+      return None
+    if entry.get("format") != SCHEMA_CACHE_FORMAT:
+      return None
+    if self.ttl_seconds is not None and time.time() - entry.get("created", 0) > self.ttl_seconds:
+      return None
+    if entry.get("attribute_tree") is None:
+      return None
+    return attribute_tree_from_table(entry["attribute_tree"])
+
+  # writes the tree to a temporary file next to its final location and swaps it in with a single rename.
+  # returns False when the tree could not be written (the run carries on without caching it)
+  def store(self, provider_version, kind, resource_version, attribute_tree):
+    path = self.entry_path(provider_version, kind, resource_version)
+    entry = {
+      "format": SCHEMA_CACHE_FORMAT,
+      "provider_version": provider_version,
+      "kind": kind,
+      "resource_version": resource_version,
+      "created": time.time(),
+      # stored as a numbered table so attributes linked under several parents (or onto themselves) stay intact
+      "attribute_tree": attribute_tree_to_table(attribute_tree),
+    }
+    temp_path = None
+    try:
+      os.makedirs(os.path.dirname(path), exist_ok=True)
+      file_descriptor, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".", suffix=".tmp")
+      with os.fdopen(file_descriptor, "w") as temp_file:
+        json.dump(entry, temp_file)
+        temp_file.flush()
+        os.fsync(temp_file.fileno())
+      os.replace(temp_path, path)
+    except (OSError, ValueError):
+      if temp_path is not None and os.path.exists(temp_path):
+        os.remove(temp_path)
+      return False
+    return True
+
+  # removes every entry matching the given keys (None matches anything) and returns how many were removed
+  def invalidate(self, provider_version=None, kind=None, resource_version=None):
+    if provider_version is not None and kind is not None and resource_version is not None:
+      paths = [self.entry_path(provider_version, kind, resource_version)]
+    else:
+      paths = []
+      if os.path.isdir(self.directory):
+        for version_folder in os.listdir(self.directory):
+          if provider_version is not None and version_folder != str(provider_version):
+            continue
+          version_path = os.path.join(self.directory, version_folder)
+          if not os.path.isdir(version_path):
+            continue
+          for file_name in os.listdir(version_path):
+            if not file_name.endswith(".json"):
+              continue
+            path = os.path.join(version_path, file_name)
+            try:
+              with open(path) as cache_file:
+                entry = json.load(cache_file)
+            except (OSError, ValueError):
+              # unreadable entries are always safe to drop
+              paths.append(path)
+              continue
+            if kind is not None and entry.get("kind") != kind:
+              continue
+            if resource_version is not None and entry.get("resource_version") != resource_version:
+              continue
+            paths.append(path)
+    removed = 0
+    for path in paths:
+      try:
+        os.remove(path)
+        removed += 1
+      except FileNotFoundError:
+        # another process got there first
+        pass
+    return removed
+
+# Purpose:
+#   These encode an attribute tree into the compact binary form stored in schema bundles and decode it again.
+#   Every distinct attribute is written once and referred to by number, so attributes that link_sections() shared
+#   between several parents stay shared (and loops stay loops) after decoding. Attribute names are stored once in
+#   a string table.
+#   Layout (little endian): string count, then (length, utf-8 bytes) per string, then the root's name number, then
+#   the attribute count, then per attribute a flags byte followed by its child count and (name number, attribute
+#   number) pairs when it can hold children, and by the string number of its redirect when it has one.
+
+def encode_attribute_tree(attribute_tree):
+  slug = next(iter(attribute_tree))
+  strings = {slug: 0}
+  # number every distinct attribute breadth first, keyed by identity so shared attributes get one number
+  nodes, node_numbers = number_attribute_nodes(attribute_tree[slug])
+  for node in nodes:
+    if node.redirect is not None:
+      strings.setdefault(node.redirect, len(strings))
+    for child_name, _ in node.items():
+      strings.setdefault(child_name, len(strings))
+  encoded_nodes = []
+  for node in nodes:
+    flags = 0
+    if node.names is None:
+      flags |= BUNDLE_NO_CHILDREN
+    if node.has_parent is not None:
+      flags |= BUNDLE_HAS_PARENT_SET | (BUNDLE_HAS_PARENT if node.has_parent else 0)
+    if node.can_have_children is not None:
+      flags |= BUNDLE_CAN_HAVE_CHILDREN_SET | (BUNDLE_CAN_HAVE_CHILDREN if node.can_have_children else 0)
+    if node.redirect is not None:
+      flags |= BUNDLE_REDIRECT
+    encoded_nodes.append(struct.pack("<B", flags))
+    if node.names is not None:
+      encoded_nodes.append(struct.pack("<I", len(node.names)))
+      for child_name, child in node.items():
+        encoded_nodes.append(struct.pack("<II", strings[child_name], node_numbers[id(child)]))
+    if node.redirect is not None:
+      encoded_nodes.append(struct.pack("<I", strings[node.redirect]))
+  encoded = [struct.pack("<I", len(strings))]
+  for string in strings:
+    string_bytes = string.encode("utf-8")
+    encoded.append(struct.pack("<H", len(string_bytes)) + string_bytes)
+  encoded.append(struct.pack("<II", strings[slug], len(nodes)))
+  return b"".join(encoded + encoded_nodes)
+
+def decode_attribute_tree(buffer):
+  offset = 0
+  (string_count,) = struct.unpack_from("<I", buffer, offset)
+  offset += 4
+  strings = []
+  for _ in range(string_count):
+    (length,) = struct.unpack_from("<H", buffer, offset)
+    offset += 2
+    strings.append(sys.intern(bytes(buffer[offset:offset + length]).decode("utf-8")))
+    offset += length
+  slug_number, node_count = struct.unpack_from("<II", buffer, offset)
+  offset += 8
+  # create every attribute up front so children can point at attributes that come later
+  nodes = [AttributeNode() for _ in range(node_count)]
+  for node in nodes:
+    (flags,) = struct.unpack_from("<B", buffer, offset)
+    offset += 1
+    if not flags & BUNDLE_NO_CHILDREN:
+      (child_count,) = struct.unpack_from("<I", buffer, offset)
+      offset += 4
+      pairs = list(struct.iter_unpack("<II", buffer[offset:offset + 8 * child_count]))
+      offset += 8 * child_count
+      node.names = intern_child_names(strings[name_number] for name_number, _ in pairs)
+      node.nodes = tuple(nodes[node_number] for _, node_number in pairs)
+    if flags & BUNDLE_REDIRECT:
+      (redirect_number,) = struct.unpack_from("<I", buffer, offset)
+      offset += 4
+      node.redirect = strings[redirect_number]
+    if flags & BUNDLE_HAS_PARENT_SET:
+      node.has_parent = bool(flags & BUNDLE_HAS_PARENT)
+    if flags & BUNDLE_CAN_HAVE_CHILDREN_SET:
+      node.can_have_children = bool(flags & BUNDLE_CAN_HAVE_CHILDREN)
+  return {strings[slug_number]: nodes[0]}
+
+# Purpose:
+#   This reads a schema bundle written by compile_schema_bundle(). The file is memory-mapped and only its index is
+#   read up front, each resource's tree is decoded the first time it is asked for. A run that only needs a
+#   "service" never pays for decoding "stateful_set".
+#   File layout: the SCHEMA_BUNDLE_MAGIC bytes, the bundle format and the length of a JSON index, then the JSON
+#   index ({"provider_version": ..., "resources": {"kind/resource_version": [offset, length]}}), then the
+#   encoded trees.
+# params:
+#    path: path to the bundle file
+
+class SchemaBundle:
+  def __init__(self, path):
+    self.path = path
+    self.trees = {}
+    with open(path, "rb") as bundle_file:
+      self.buffer = mmap.mmap(bundle_file.fileno(), 0, access=mmap.ACCESS_READ)
+    header_length = len(SCHEMA_BUNDLE_MAGIC) + 8
+    if self.buffer[:len(SCHEMA_BUNDLE_MAGIC)] != SCHEMA_BUNDLE_MAGIC:
+      raise ValueError(f"{path} is not a schema bundle")
+    bundle_format, index_length = struct.unpack_from("<II", self.buffer, len(SCHEMA_BUNDLE_MAGIC))
+    if bundle_format != SCHEMA_BUNDLE_FORMAT:
+      raise ValueError(f"{path} was compiled in bundle format {bundle_format}, expected {SCHEMA_BUNDLE_FORMAT}")
+    index = json.loads(self.buffer[header_length:header_length + index_length].decode("utf-8"))
+    self.provider_version = index["provider_version"]
+    self.resources = index["resources"]
+
+  # returns the attribute tree for a resource, or None when the bundle doesn't hold it
+  def load(self, kind, resource_version):
+    resource_key = f"{kind}/{resource_version}"
+    if resource_key not in self.trees:
+      if resource_key not in self.resources:
+        return None
+      offset, length = self.resources[resource_key]
+      self.trees[resource_key] = decode_attribute_tree(memoryview(self.buffer)[offset:offset + length])
+    return self.trees[resource_key]
+
+# Purpose:
+#   This is the "compile schemas" step. It acquires the attribute trees for the given resources (from the registry or
+#   the schema cache) and writes them into a single schema bundle that later runs can translate from without any
+#   registry access.
+# params:
+#    path: where the bundle is written. The file is replaced atomically.
+#    resources: an iterable of (kind, resource_version) pairs to include
+# returns :
+#    a list of the (kind, resource_version) pairs that made it into the bundle
+
+def compile_schema_bundle(path, resources):
+  resources = sorted(set(resources))
+  prefetch_attribute_trees(SCRAPE_URL_1, resources)
+  encoded_trees = []
+  compiled = []
+  # resources that redirects point at are compiled too, so a bundle can resolve redirects without the registry
+  pending = list(resources)
+  seen = set(resources)
+  while pending:
+    kind, resource_version = pending.pop(0)
+    try:
+      attribute_tree = get_attribute_tree(SCRAPE_URL_1, kind, resource_version)
+    except Exception as error:
+      print(f"could not compile {kind} {resource_version}: {error}")
+      continue
+    encoded_trees.append((f"{kind}/{resource_version}", encode_attribute_tree(attribute_tree)))
+    compiled.append((kind, resource_version))
+    for target in sorted(redirect_targets(attribute_tree, resource_version) - seen):
+      seen.add(target)
+      pending.append(target)
+
+  # offsets depend on the index length, so lay the trees out relative to the end of the index first
+  relative_index = {}
+  position = 0
+  for resource_key, encoded_tree in encoded_trees:
+    relative_index[resource_key] = [position, len(encoded_tree)]
+    position += len(encoded_tree)
+  index_bytes = b""
+  data_start = 0
+  while True:
+    resources_index = {key: [data_start + offset, length] for key, (offset, length) in relative_index.items()}
+    index_bytes = json.dumps({"provider_version": WORKING_PROVIDER_VERSION, "resources": resources_index}).encode("utf-8")
+    header_length = len(SCHEMA_BUNDLE_MAGIC) + 8 + len(index_bytes)
+    if header_length == data_start:
+      break
+    data_start = header_length
+
+  folder = os.path.dirname(os.path.abspath(path))
+  file_descriptor, temp_path = tempfile.mkstemp(dir=folder, prefix=".", suffix=".tmp")
+  try:
+    with os.fdopen(file_descriptor, "wb") as bundle_file:
+      bundle_file.write(SCHEMA_BUNDLE_MAGIC + struct.pack("<II", SCHEMA_BUNDLE_FORMAT, len(index_bytes)) + index_bytes)
+      for _, encoded_tree in encoded_trees:
+        bundle_file.write(encoded_tree)
+    os.replace(temp_path, path)
+  except OSError:
+    if os.path.exists(temp_path):
+      os.remove(temp_path)
+    raise
+  return compiled
+
+# returns the (kind, resource_version) of every resource that the unresolved redirects in a tree point at
+def redirect_targets(attribute_tree, default_resource_version=None):
+  targets = set()
+  nodes = list(attribute_tree.values())
+  visited = {id(node) for node in nodes}
+  while nodes:
+    node = nodes.pop()
+    if node.redirect is not None:
+      kind, _, resource_version = node.redirect.partition("#")[0].partition("/")
+      targets.add((kind, resource_version or default_resource_version))
+    for _, child in node.items():
+      if id(child) not in visited:
+        visited.add(id(child))
+        nodes.append(child)
+  return targets
+
+# returns the schema bundle at schema_bundle_path, opening it the first time it is needed
+def get_schema_bundle():
+  global schema_bundle
+  with registry_lock:
+    if schema_bundle is None or schema_bundle.path != schema_bundle_path:
+      schema_bundle = SchemaBundle(schema_bundle_path)
+  return schema_bundle
+
+# Purpose:
+#   This finds the attribute tree for a resource. Trees are kept in memory for the rest of the run. A compiled schema
+#   bundle is used first when schema_bundle_path is set, then the on-disk schema cache when it is enabled, so
+#   Terraform's documentation is only scraped on a miss. The lookup itself is the one every SchemaProvider does.
+# params:
+#    scrape_url: the URL passed on to scrape()
+#    kind: the snake_case name of the K8s resource
+#    resource_version: the version the user has made their k8s resource (ie: v1)
+# returns :
+#    the attribute tree for the resource
+
+def get_attribute_tree(scrape_url, kind, resource_version):
+  return module_schema_provider(scrape_url)(kind, resource_version)
+
+# returns a SchemaProvider following the module level settings as they are now, sharing attribute_trees
+def module_schema_provider(scrape_url=SCRAPE_URL_1):
+  return SchemaProvider(get_schema_bundle() if schema_bundle_path is not None else None,
+    SchemaCache(cache_directory, cache_ttl_seconds) if cache_resource_trees else None, attribute_trees, scrape_url)
+
+# Purpose:
+#   This acquires the attribute tree of a resource from a schema bundle, then a schema cache and finally the registry,
+#   storing scraped trees in the schema cache. Nothing is kept in memory, that is up to the caller.
+# params:
+#    scrape_url: the URL passed on to scrape()
+#    kind: the snake_case name of the K8s resource
+#    resource_version: the version the user has made their k8s resource (ie: v1)
+#    bundle: a SchemaBundle to look in first, or None
+#    schema_cache: a SchemaCache to look in before scraping, or None
+# returns :
+#    the attribute tree for the resource
+
+def acquire_attribute_tree(scrape_url, kind, resource_version, bundle=None, schema_cache=None):
+  attribute_tree = None
+  if bundle is not None and bundle.provider_version == WORKING_PROVIDER_VERSION:
+    attribute_tree = bundle.load(kind, resource_version)
+    metrics.count("cache.bundle.misses" if attribute_tree is None else "cache.bundle.hits")
+  if attribute_tree is None and schema_cache is None:
+    attribute_tree = scrape(scrape_url, kind, resource_version)
+  elif attribute_tree is None:
+    attribute_tree = schema_cache.load(WORKING_PROVIDER_VERSION, kind, resource_version)
+    metrics.count("cache.disk.misses" if attribute_tree is None else "cache.disk.hits")
+    if attribute_tree is None:
+      attribute_tree = scrape(scrape_url, kind, resource_version)
+      if not schema_cache.store(WORKING_PROVIDER_VERSION, kind, resource_version, attribute_tree):
+        metrics.count("cache.disk.store_failures")
+        # stderr keeps the batch mode's stdout clean
+        print(f"could not cache {kind} {resource_version} in {schema_cache.directory}", file=sys.stderr)
+  return attribute_tree
+
+# Purpose:
+#   This is a schema provider for embedding the translator: it hands out attribute trees from its own bundle, cache
+#   and in-memory trees instead of the module level settings used by main(). Instances are called with
+#   (kind, resource_version), the same as the resolve_tree functions taken by translate_documents().
+# params:
+#    schema_bundle: a SchemaBundle to look in first, or None
+#    schema_cache: a SchemaCache to look in before scraping, or None
+#    trees: a dict of already acquired trees keyed by (provider version, kind, resource version), shared between
+#       providers when given
+#    scrape_url: the URL passed on to scrape()
+
+class SchemaProvider:
+  def __init__(self, schema_bundle=None, schema_cache=None, trees=None, scrape_url=SCRAPE_URL_1):
+    self.schema_bundle = schema_bundle
+    self.schema_cache = schema_cache
+    self.trees = {} if trees is None else trees
+    self.scrape_url = scrape_url
+
+  def __call__(self, kind, resource_version):
+    tree_key = (WORKING_PROVIDER_VERSION, kind, resource_version)
+    attribute_tree = self.trees.get(tree_key)
+    if attribute_tree is not None:
+      metrics.count("cache.memory.hits")
+      return attribute_tree
+    metrics.count("cache.memory.misses")
+    attribute_tree = acquire_attribute_tree(self.scrape_url, kind, resource_version, self.schema_bundle, self.schema_cache)
+    self.trees[tree_key] = attribute_tree
+    return attribute_tree
+
+# Purpose:
+#   This downloads the attribute trees of many resources in parallel so that translation can start with every
+#   tree already in memory. Network latency is overlapped instead of being paid one resource at a time.
+# params:
+#    scrape_url: the URL passed on to scrape()
+#    resources: an iterable of (kind, resource_version) pairs
+#    max_workers: the number of trees fetched at the same time
+# returns :
+#    nothing. Trees that fail to download are reported and left to be fetched again during translation.
+
+def prefetch_attribute_trees(scrape_url, resources, max_workers=None):
+  missing = sorted(r for r in set(resources) if (WORKING_PROVIDER_VERSION,) + r not in attribute_trees)
+  if len(missing) == 0:
+    return
+  with ThreadPoolExecutor(max_workers=max_workers or prefetch_workers) as executor:
+    futures = {executor.submit(get_attribute_tree, scrape_url, kind, resource_version): (kind, resource_version)
+      for kind, resource_version in missing}
+    for future in as_completed(futures):
+      try:
+        future.result()
+      except Exception as error:
+        kind, resource_version = futures[future]
+        print(f"could not prefetch {kind} {resource_version}: {error}")
+
+# Purpose:
+#   This splits a single YAML line into the key value pair that gets translated
+# params:
+#    raw_line: a line from a k8s YAML file
+# returns :
+#    ["key", "value"] with the value stripped of comments and quotes, or None for comment and empty lines
+
+def parse_line(raw_line):
+  if "#" in raw_line and raw_line.lstrip().index("#") == 0:
+    #skip comment lines for now
+    return None
+  # ": " to limit splitting to KV pairs instead of splitting data
+  line = raw_line.lstrip("- ")
+  if re.match(r"[\s\t]*(?:[\n\r]+|$)", line) is not None:
+    #line with no info detected
+    return None
+  # sepperate split helps avoid oversplitting, the key may also end the text (last line without a newline)
+  KV_pair = re.split(KEY_SEPARATOR_PATTERN, line, maxsplit=1)
+  KV_pair = [KV_pair[0]] + re.split(r"\s*#", KV_pair[1], maxsplit=1)[:2]
+  KV_pair[1] = KV_pair[1].strip().strip('\"')
+  return KV_pair
+
+# returns the (kind, resource_version) of every document in the given files of the YAML folder, skipping files that
+# can no longer be read (the file itself gets reported when it is translated)
+def read_all_resource_headers(file_names, yaml_folder="YAML"):
+  resources = []
+  for file_name in file_names:
+    try:
+      resources.extend(read_resource_headers(rf"{yaml_folder}/{file_name}"))
+    except OSError:
+      pass
+  return resources
+
+# converts a YAML "kind" value into the snake_case name terraform uses for the resource (ie: StatefulSet -> stateful_set)
+def parse_kind(value):
+  # to_snake_case() leaves keys without camel case alone, kinds are always lower cased (ie: Service -> service)
+  return to_snake_case(value).lower()
+
+# Purpose:
+#   This reads just enough of each document in a k8s YAML to know which resource schemas it needs
+# params:
+#    file_path: path to the YAML file
+# returns :
+#    a list of (kind, resource_version) for every document that declares both
+
+def read_resource_headers(file_path):
+  resources = []
+  kind = None
+  resource_version = None
+  with open(file_path) as file:
+    for raw_line in file:
+      if DOCUMENT_SEPARATOR_PATTERN.match(raw_line):
+        kind = None
+        resource_version = None
+        continue
+      if kind is not None or KEY_SEPARATOR_PATTERN.search(raw_line) is None:
+        continue
+      KV_pair = parse_line(raw_line)
+      if KV_pair is None:
+        continue
+      if resource_version is None:
+        if KV_pair[0] == "apiVersion":
+          resource_version = KV_pair[1].split("/")[-1]
+      elif KV_pair[0] == "kind":
+        kind = parse_kind(KV_pair[1])
+        resources.append((kind, resource_version))
+  return resources
 
 # Purpose:
 #   This function is designed to pre-process YAML env blocks into a format that is more intuitive for the 
 #   interpretation software (each variable in a single k8s YAML env block need's its own env blcok in .tf).
+#   Every env block in the file is rewritten in a single pass: each line is transformed as it is read, using only
+#   the indent of the "env:" line it belongs to and the line before it.
 # params:
 #    original_file_lines: 
-#       An array of the YAML file lines taken from the file that needs to be interpreted
-#    initial_index:
-#       This is the line number that the env block starts on within the original_file_lines array
+#       An iterable of the YAML file lines taken from the file that needs to be interpreted
 # returns :
-#    An array of file lines that swaps the original env block with a new set of processed file lines.
-
-def process_env_block(original_file_lines, initial_index):
-  processed_env_lines = []
-  env_indent_level = len(original_file_lines[initial_index]) - len(original_file_lines[initial_index].lstrip())
-  # - indicates block start and end
-  # decrement to original indent level indicates end and return
-  final_i=None
-  for i in range(initial_index + 1, len(original_file_lines)):
-    this_indent_level = len(original_file_lines[i]) - len(original_file_lines[i].lstrip())
-    this_line = original_file_lines[i].lstrip()
-    if re.search(r'#+.*', this_line):
-      continue 
-    if this_indent_level<=env_indent_level :
-      #means that we are done pre processing env
-      final_i=i
-      break
-    if re.search(r'^-.*', this_line):
-      last_line = original_file_lines[i-1].strip()
-      # new block identified
-      if "env:" in last_line:
-        processed_env_lines.append(" " * (env_indent_level + 2) + this_line.lstrip("- "))
-      else:
-        #processed_env_lines.append(" " * env_indent_level + "}")
-        processed_env_lines.append(" " * env_indent_level + "env:\n")
-        processed_env_lines.append(" " * (this_indent_level) + this_line.lstrip("- "))
-    else :
-      processed_env_lines.append(" " * (this_indent_level-2) + this_line)
+#    A generator of file lines where each env block has been swapped with a set of processed file lines.
 
-  return original_file_lines[:initial_index + 1] + processed_env_lines + original_file_lines[final_i:]
+def rewrite_env_blocks(original_file_lines):
+  # indent of the "env:" line whose block is being rewritten, None outside of env blocks
+  env_indent_level = None
+  last_line = ''
+  for line in original_file_lines:
+    this_indent_level = len(line) - len(line.lstrip())
+    this_line = line.lstrip()
+    if env_indent_level is not None:
+      if "#" in this_line:
+        # comments within env blocks are dropped
+        last_line = line
+        continue
+      if this_indent_level > env_indent_level:
+        # - indicates block start and end
+        if this_line.startswith("-"):
+          # new block identified
+          if "env:" in last_line:
+            yield " " * (env_indent_level + 2) + this_line.lstrip("- ")
+          else:
+            yield " " * env_indent_level + "env:\n"
+            yield " " * this_indent_level + this_line.lstrip("- ")
+        else:
+          yield " " * (this_indent_level - 2) + this_line
+        last_line = line
+        continue
+      # decrement to original indent level indicates the end of the block
+      env_indent_level = None
+    if ENV_BLOCK_PATTERN.search(line):
+      env_indent_level = this_indent_level
+    last_line = line
+    yield line
 
 # Purpose:
 #   This function is designed to itterate through the file lines of a k8s YAML that needs to be translated
-#   and transforms certain blocks into a more intuitive format for the translation software.
+#   and transforms certain blocks into a more intuitive format for the translation software. Lines are read and
+#   passed on one at a time.
 # params:
 #    original_file_lines: 
-#       An array of the YAML file lines taken from the file that needs to be interpreted
+#       An iterable of the YAML file lines taken from the file that needs to be interpreted (ie: an open file)
 # returns :
-#    An array of file lines that is processed
+#    A generator of the processed file lines
 
 def pre_process(original_file_lines):
-  pre_processed_lines = original_file_lines.copy()
-  for i in range(0, len(original_file_lines)):
-      if re.search(r"\s+env:.*", original_file_lines[i]):
-        pre_processed_lines = process_env_block(pre_processed_lines, i)
+  return rewrite_env_blocks(original_file_lines)
+
+# looks up the attribute tree for a resource from the registry (or the schema cache when it is enabled)
+def resolve_attribute_tree(kind, resource_version):
+  return get_attribute_tree(SCRAPE_URL_1, kind, resource_version)
+
+# Purpose:
+#   This translates the (pre-processed) lines of a single k8s YAML document into the lines of a .tf resource block.
+#   Translated lines are handed out as soon as they are final, so memory use depends on how deeply the YAML is
+#   nested rather than how long it is.
+# params:
+#    yaml_file_lines: an iterable of pre-processed YAML lines
+#    resolve_tree: a function taking (kind, resource_version) and returning the resource's attribute tree
+#    resource_name: the name given to the terraform resource
+# returns :
+#    A generator of .tf lines (without line endings). Nothing is generated for documents without a kind.
+
+def translate_lines(yaml_file_lines, resolve_tree=resolve_attribute_tree, resource_name="REPLACE_ME"):
+  # tracks the indent level of the read file
+  space_stack = [0, 2]
+  last_leading_spaces = 2
+  # the most recently translated line is held back because an indent on the next line adds its curly brace
+  last_line = None
+  # holds the type of file that is being processed so we can lookup the translation in dictionary
+  kind = None
+  # a boolean to track whether the top level 'kind' has been translated
+  kind_translated = False
+  # holds the version that the user has made their k8s resource
+  resource_version = None
+  # dicitonary of terraform attributes arranged in tree hierarchy
+  attribute_tree = None
+  # tracks the attribute being translated within attribute_tree
+  cursor = None
+
+  for yaml_line in yaml_file_lines:
+    this_line = ''
+    KV_pair = parse_line(yaml_line)
+    if KV_pair is None:
+      continue
+
+    # 2 added because terraform has additional indent within "resource" block
+    this_leading_spaces = len(yaml_line) - len(yaml_line.lstrip("- ")) + 2
+    if resource_version is None:
+      if KV_pair[0] == "apiVersion":
+        resource_version  = KV_pair[1].split("/")[-1]
+      else:
+        continue
+
+    if kind is None:
+      #useful file info starts here
+      if KV_pair[0] == "kind":
+        kind = parse_kind(KV_pair[1])
       else:
         continue
-  return pre_processed_lines
+    #### STEP ===> lookup Cached Version or scrape current version
+    if attribute_tree is None:
+      attribute_tree = resolve_tree(kind, resource_version)
+      cursor = TreeCursor(attribute_tree, resolve_tree, resource_version)
+    #### STEP ====> format file write data
+    if this_leading_spaces > last_leading_spaces:
+      # an indent has occurred
+      space_stack.append(this_leading_spaces)
+      # ensure last written line has correct curly brace
+      if last_line.rstrip()[-1] == ":":
+        last_line = last_line.rstrip()[:-1].rstrip() + " {"
+      else:
+        last_line = last_line.rstrip() + " {"
+    elif this_leading_spaces < last_leading_spaces:
+      # we just went down an indent
+      while space_stack[-1] > this_leading_spaces:
+        #close current blocks
+        cursor.pop()
+        #popping space stack before appending to generate correct indents
+        space_stack.pop()
+        yield last_line
+        last_line = ' ' * space_stack[-1] + "}"
+
+    if KV_pair[0] == "kind" and not kind_translated:
+      this_line += fr'resource "kubernetes_{KV_pair[1].lower()}" "{resource_name}" {{'
+      kind_translated = True
+    else :
+      this_line += ' ' * this_leading_spaces  # indents
+      res = terra_translate(KV_pair, cursor)  # returns a string with ['TERRAFORM_NAME', 'formatted printout']
+      this_line += res[1]
+
+    last_leading_spaces = this_leading_spaces
+    if last_line is not None:
+      yield last_line
+    last_line = this_line
+
+  if last_line is None:
+    return
+  yield last_line
+  # for writing closing curly braces at end of translation
+  while len(space_stack) > 1:
+    space_stack.pop()
+    yield ' ' * space_stack[-1] + "}"
 
+# Purpose:
+#   This translates a YAML stream holding any number of "---" separated documents (ie: "helm template" output). The
+#   stream is read once, each document is translated on its own with its own schema tree (trees are shared through
+#   resolve_tree's cache) and each one becomes its own resource block. A document that can't be translated (ie: a
+#   custom resource without a terraform doc) is replaced by a comment naming the error, and the rest of the stream is
+#   still translated. Registry errors (OSError) still stop the stream, as the document may translate next time.
+# params:
+#    yaml_file_lines: an iterable of pre-processed YAML lines
+#    resolve_tree: a function taking (kind, resource_version) and returning the resource's attribute tree
+#    document_errors: a list that (document number, error) is appended to for every document that failed, or None.
+#       Documents are numbered from 1 and documents without any content aren't counted.
+# returns :
+#    A generator of .tf lines (without line endings), with a blank line between resource blocks
+
+def translate_documents(yaml_file_lines, resolve_tree=resolve_attribute_tree, document_errors=None):
+  document_number = 0
+  def document_of(line):
+    nonlocal document_number
+    if DOCUMENT_SEPARATOR_PATTERN.match(line):
+      document_number += 1
+    return document_number
+
+  resources_translated = 0
+  documents_read = 0
+  for _, document_lines in groupby(yaml_file_lines, key=document_of):
+    document_lines = (line for line in document_lines if not DOCUMENT_SEPARATOR_PATTERN.match(line))
+    # terraform resource names must be unique within a file
+    resource_name = "REPLACE_ME" if resources_translated == 0 else f"REPLACE_ME_{resources_translated + 1}"
+    try:
+      # a document is translated in full before it is passed on, so a failing one leaves no half written block behind
+      tf_lines = list(translate_lines(document_lines, resolve_tree, resource_name))
+    except OSError:
+      raise
+    except Exception as error:
+      documents_read += 1
+      metrics.count("translate.document_failures")
+      error_text = f"{type(error).__name__}: {error}"
+      if document_errors is not None:
+        document_errors.append((documents_read, error_text))
+      if documents_read > 1:
+        yield ""
+      yield f"# could not translate document {documents_read}: {error_text}"
+      continue
+    if len(tf_lines) == 0:
+      continue
+    documents_read += 1
+    if documents_read > 1:
+      yield ""
+    resources_translated += 1
+    yield from tf_lines
+
+# Purpose:
+#   This is the library entry point: it translates the text of a k8s YAML (any number of "---" separated documents)
+#   into the text of a .tf file, without reading or writing any files.
+# params:
+#    yaml_text: the contents of a k8s YAML
+#    schema_provider: a function taking (kind, resource_version) and returning the resource's attribute tree, such as
+#       a SchemaProvider. Defaults to the trees shared by the rest of the run.
+#    document_errors: a list that (document number, error) is appended to for every document that failed, or None
+# returns :
+#    the .tf text, the same as translate_file() would write for a file holding yaml_text
+
+def translate_yaml(yaml_text, schema_provider=resolve_attribute_tree, document_errors=None):
+  # read line by line with universal newlines exactly like a file, str.splitlines() would also split on form feeds,
+  # \u2028 and the like
+  return "".join(text + "\n" for text in translate_documents(pre_process(io.StringIO(yaml_text, newline=None)), schema_provider,
+    document_errors))
+
+# Purpose:
+#   This translates a single k8s YAML from the YAML folder and writes the resulting .tf file. The file is streamed
+#   through read -> pre_process -> translate -> write, so each document is written as soon as it is translated, and
+#   every document in the file becomes its own resource block. Documents that can't be translated are reported with
+#   their number and left out of the .tf file (see translate_documents()). Each file is translated independently, so this runs the
+#   same way in the main process or inside a worker process.
+# params:
+#    file_name: the name of the file within the YAML folder
+#    output_folder: the folder that the .tf file is written to
+# returns :
+#    nothing
+
+def translate_file(file_name, output_folder):
+  output_path = f"{output_folder}/{tf_file_name(file_name)}"
+  start = time.perf_counter()
+  snake_case_cache = to_snake_case.cache_info()
+  output_lines = 0
+  document_errors = []
+  try:
+    with open(rf"YAML/{file_name}") as yaml_file, open(output_path, "w+") as tf_file:
+      #### STEP ====> pre-process YAMLS so it's easier to translate with a uniform set of rules.
+      yaml_file_lines = pre_process(yaml_file)
+      if metrics.enabled:
+        yaml_file_lines = metrics.timed_iter("pre_process", yaml_file_lines)
+      # the translate timer includes the pre_process time of the lines it pulls through
+      tf_lines = translate_documents(yaml_file_lines, document_errors=document_errors)
+      if metrics.enabled:
+        tf_lines = metrics.timed_iter("translate", tf_lines)
+        write_seconds = 0.0
+        for text in tf_lines:
+          write_start = time.perf_counter()
+          tf_file.write(text + "\n")
+          write_seconds += time.perf_counter() - write_start
+          output_lines += 1
+        metrics.add_time("file_write", write_seconds)
+      else:
+        for text in tf_lines:
+          tf_file.write(text + "\n")
+          output_lines += 1
+  except Exception as error:
+    # don't leave a half written .tf file behind
+    if os.path.exists(output_path):
+      os.remove(output_path)
+    metrics.record_file(file_name, time.perf_counter() - start, output_lines, f"{type(error).__name__}: {error}",
+      document_errors)
+    raise
+  finally:
+    # counted per file so that files translated in worker processes are included too
+    metrics.count("cache.snake_case.hits", to_snake_case.cache_info().hits - snake_case_cache.hits)
+    metrics.count("cache.snake_case.misses", to_snake_case.cache_info().misses - snake_case_cache.misses)
+  for document, error in document_errors:
+    print(f"could not translate document {document} of {file_name}: {error}")
+  metrics.record_file(file_name, time.perf_counter() - start, output_lines, document_errors=document_errors)
+
+# returns the name of the .tf file a YAML is translated into (ie: example_service.yml -> example_service.tf)
+def tf_file_name(file_name):
+  return file_name.split(".")[0] + ".tf"
+
+# Purpose:
+#   This wraps translate_file() so that one broken YAML is reported instead of stopping the rest of the run
+# returns :
+#    (file_name, None) on success or (file_name, "error description") on failure
+
+def translate_file_safely(file_name, output_folder):
+  try:
+    translate_file(file_name, output_folder)
+  except Exception as error:
+    return (file_name, f"{type(error).__name__}: {error}")
+  return (file_name, None)
+
+# runs in each worker process as it starts so that the trees are shipped to a worker once instead of per file
+def load_worker_trees(trees, metrics_enabled=False):
+  global http_session
+  attribute_trees.update(trees)
+  metrics.enabled = metrics_enabled
+  # a forked worker would otherwise share the main process's pooled sockets, it opens its own on first use
+  http_session = None
+
+# runs a file in a worker process and hands that file's metrics back to the main process along with the result
+def translate_file_in_worker(file_name, output_folder):
+  metrics.reset()
+  return translate_file_safely(file_name, output_folder), metrics.snapshot()
+
+# Purpose:
+#   This translates a list of YAML files, either one after another or spread over a pool of worker processes. Every
+#   file is translated by the same code in both modes, so the generated files are identical either way.
+# params:
+#    file_names: the names of the files within the YAML folder
+#    output_folder: the folder that the .tf files are written to
+#    workers: the number of worker processes to use, 1 translates everything in this process
+# returns :
+#    a list of (file_name, error) in the same order as file_names, where error is None for successful files
+
+def translate_files(file_names, output_folder, workers=1):
+  if workers <= 1 or len(file_names) <= 1:
+    return [translate_file_safely(file_name, output_folder) for file_name in file_names]
+  # redirects stay lazy in the workers too: a referenced tree is only fetched (at most once per worker) when one of
+  # its files descends into the attribute, unless it was already in memory here
+  results = []
+  with ProcessPoolExecutor(max_workers=workers, initializer=load_worker_trees,
+      initargs=(attribute_trees, metrics.enabled)) as executor:
+    for result, worker_metrics in executor.map(translate_file_in_worker, file_names, [output_folder] * len(file_names)):
+      metrics.merge(worker_metrics)
+      results.append(result)
+  return results
+
+# Purpose:
+#   This writes the metrics of the run as a JSON report, so runs can be compared with each other
+# params:
+#    report_path: where the report is written
+#    wall_seconds: how long the whole run took
+#    workers: the number of translation processes used
+# returns :
+#    the report as a dictionary
+
+def write_metrics_report(report_path, wall_seconds, workers):
+  report = metrics.snapshot()
+  report["wall_seconds"] = wall_seconds
+  report["workers"] = workers
+  # hit rates of every cache, from the counters that were collected in this process and in the workers
+  report["caches"] = {}
+  for name in ("memory", "bundle", "disk", "match", "snake_case"):
+    hits = report["counters"].get(f"cache.{name}.hits", 0)
+    misses = report["counters"].get(f"cache.{name}.misses", 0)
+    report["caches"][name] = {"hits": hits, "misses": misses,
+      "hit_rate": hits / (hits + misses) if hits + misses else None}
+  with open(report_path, "w") as report_file:
+    json.dump(report, report_file, indent=2, sort_keys=True)
+  return report
+
+# returns the sha256 of a file's contents, read in blocks so large manifests aren't loaded whole
+def hash_file(path):
+  digest = hashlib.sha256()
+  with open(path, "rb") as source_file:
+    for block in iter(lambda: source_file.read(1 << 16), b""):
+      digest.update(block)
+  return digest.hexdigest()
+
+# Purpose:
+#   This records what every generated .tf file in an output folder was translated from: the YAML it came from, the
+#   hash of that YAML's contents, the provider version its schemas were scraped for and the translator version.
+#   An incremental run only re-translates YAMLs whose record no longer matches and removes the .tf files whose
+#   YAML has disappeared. The manifest is written to a temporary file and renamed into place like SchemaCache.
+# params:
+#    output_folder: the folder holding the generated .tf files and the manifest
+
+class TranslationManifest:
+  def __init__(self, output_folder):
+    self.output_folder = output_folder
+    self.path = os.path.join(output_folder, TRANSLATION_MANIFEST_NAME)
+    # .tf file name -> {"source": ..., "source_sha256": ..., "provider_version": ..., "translator_version": ...}
+    self.entries = {}
+    try:
+      with open(self.path) as manifest_file:
+        self.entries = json.load(manifest_file).get("outputs", {})
+    except (OSError, ValueError):
+      # a missing or unreadable manifest just means every file gets translated
+      pass
+
+  def entry_for(self, file_name, source_sha256):
+    return {
+      "source": file_name,
+      "source_sha256": source_sha256,
+      "provider_version": WORKING_PROVIDER_VERSION,
+      "translator_version": TRANSLATOR_VERSION,
+    }
+
+  # returns True when the .tf file for file_name exists and was translated from exactly these inputs
+  def is_current(self, file_name, source_sha256):
+    output_name = tf_file_name(file_name)
+    return (self.entries.get(output_name) == self.entry_for(file_name, source_sha256)
+      and os.path.exists(os.path.join(self.output_folder, output_name)))
+
+  def record(self, file_name, source_sha256):
+    self.entries[tf_file_name(file_name)] = self.entry_for(file_name, source_sha256)
+
+  def forget(self, file_name):
+    self.entries.pop(tf_file_name(file_name), None)
+
+  # removes the .tf files whose YAML is no longer in file_names and returns their names
+  def remove_orphans(self, file_names):
+    current_outputs = {tf_file_name(file_name) for file_name in file_names}
+    removed = []
+    for output_name in sorted(set(self.entries) - current_outputs):
+      try:
+        os.remove(os.path.join(self.output_folder, output_name))
+      except FileNotFoundError:
+        pass
+      del self.entries[output_name]
+      removed.append(output_name)
+    return removed
+
+  def save(self):
+    file_descriptor, temp_path = tempfile.mkstemp(dir=self.output_folder, prefix=".", suffix=".tmp")
+    try:
+      with os.fdopen(file_descriptor, "w") as temp_file:
+        json.dump({"outputs": self.entries}, temp_file, indent=1, sort_keys=True)
+      os.replace(temp_path, self.path)
+    except OSError:
+      if os.path.exists(temp_path):
+        os.remove(temp_path)
+      raise
+
+
+# Purpose:
+#   This brings the .tf files in an output folder up to date with the YAML folder. The .tf files of deleted YAMLs
+#   are removed, and the YAMLs whose recorded inputs (see TranslationManifest) no longer match are translated again
+#   after their schemas were prefetched.
+# params:
+#    file_names: the names of every file currently in the YAML folder
+#    output_folder: the folder that the .tf files are written to
+#    workers: the number of processes translating files at the same time
+#    candidates: the file names that may have changed, None checks every file in file_names
+# returns :
+#    the names of the files that were translated
+
+def translate_changed_files(file_names, output_folder, workers=1, candidates=None):
+  manifest = TranslationManifest(output_folder)
+  for output_name in manifest.remove_orphans(file_names):
+    print(f"removed {output_name}, its YAML no longer exists")
+  if candidates is None:
+    candidates = file_names
+  #### STEP ====> skip the YAMLs whose .tf file was already translated from the same inputs
+  source_hashes = {}
+  for file_name in candidates:
+    try:
+      source_hashes[file_name] = hash_file(rf"YAML/{file_name}")
+    except OSError as error:
+      # folders, and files that were removed after the folder was listed
+      print(f"could not read {file_name}: {error}")
+  changed = [file_name for file_name in source_hashes if not manifest.is_current(file_name, source_hashes[file_name])]
+  metrics.count("incremental.unchanged", len(source_hashes) - len(changed))
+  metrics.count("incremental.translated", len(changed))
+  #### STEP ====> download the schema of every resource kind up front so translation starts with warm trees
+  prefetch_attribute_trees(SCRAPE_URL_1, read_all_resource_headers(changed))
+  for file_name, error in translate_files(changed, output_folder, workers):
+    if error is not None:
+      manifest.forget(file_name)
+      print(f"failed to translate {file_name}: {error}")
+    else:
+      manifest.record(file_name, source_hashes[file_name])
+  manifest.save()
+  return changed
 
 # Purpose: 
 #    This is the main point of entry for this program. It is designed to  in file system at the YAML directory 
 #    your in CWD and use it's YAML file contents to scrape Online documentation adn then translate those files 
 #    into a set of equivalent .tf files.
+# params:
+#    workers: the number of processes translating files at the same time, defaults to translation_workers
+#    schema_bundle: path to a compiled schema bundle to translate from, defaults to schema_bundle_path
+#    report_path: where to write a JSON report of the run's timers and counters, or None for no report
+#    incremental: keep the output folder and only re-translate changed YAMLs, defaults to incremental_translation
 
-def main():
-  SCRAPE_URL_1 = "https://registry.terraform.io/v2/providers/hashicorp/kubernetes?include=categories,moved-to,potential-fork-of,provider-versions,top-modules&include=categories%2Cmoved-to%2Cpotential-fork-of%2Cprovider-versions%2Ctop-modules&name=kubernetes&namespace=hashicorp"
+def main(workers=None, schema_bundle=None, report_path=None, incremental=None):
+  global schema_bundle_path
+  if workers is None:
+    workers = translation_workers
+  if schema_bundle is not None:
+    schema_bundle_path = schema_bundle
+  if incremental is None:
+    incremental = incremental_translation
+  run_start = time.perf_counter()
+  metrics.reset()
+  metrics.enabled = report_path is not None
   # STEP: identify files that need converting, then feed each of their "kinds"
-  YAMLS = os.listdir(os.getcwd() + r"\YAML")
+  YAMLS = os.listdir("YAML")
   output_folder = './tf files'
-  if os.path.exists(output_folder):
+  if os.path.exists(output_folder) and not incremental:
     # clear output folder
     shutil.rmtree(output_folder)
-  os.makedirs(output_folder)
-  for file_name in YAMLS:
-    # tracks the indent level of the read file
-    space_stack = [0, 2]
-    last_leading_spaces = 2
-    # list of lines to write to a file once the translation is done
-    write_lines = []
-    # holds the type of file that is being processed so we can lookup the translation in dictionary
-    kind = None
-    # a boolean to track whether the top level 'kind' has been translated
-    kind_translated = False
-    # holds the version that the user has made their k8s resource
-    resource_version = None
-    # holds log of dictionary navigation for easy hierarchy traversal
-    tree_log = []
-    # dicitonary of terraform attributes arranged in tree hierarchy
-    attribute_tree = None
-    
-    #### STEP ====> pre-process YAMLS so it's easier to translate with a uniform set of rules.
-    file = open(rf"YAML/{file_name}")
-    yaml_file_lines = pre_process(file.readlines())
-    file.close()
-
-    for i in range(0, len(yaml_file_lines)):
-      if "#" in yaml_file_lines[i] and yaml_file_lines[i].lstrip().index("#") == 0:
-        #skip comment lines for now
-        continue
+  os.makedirs(output_folder, exist_ok=True)
+  changed = translate_changed_files(YAMLS, output_folder, workers)
+  if incremental:
+    print(f"translated {len(changed)} of {len(YAMLS)} files, the rest were unchanged")
+  if report_path is not None:
+    write_metrics_report(report_path, time.perf_counter() - run_start, workers)
+  print("DONE!!!")
 
-      this_line = ''
-      # ": " to limit splitting to KV pairs instead of splitting data
-      line = yaml_file_lines[i].lstrip("- ")
-      if re.match(r"[\s\t]*[\n\r]+", line) is not None:
-        #line with no info detected
-        continue
-      # sepperate split helps avoid oversplitting
-      KV_pair = re.split( r":[\s\n]+", line, maxsplit=1)
-      KV_pair = [KV_pair[0]] + re.split(r"\s*#", KV_pair[1], maxsplit=1)[:2]
-      KV_pair[1] = KV_pair[1].strip().strip('\"')
+# returns (kind, resource_version) for a "kind/resource_version" command line argument (ie: deployment/v1)
+def parse_resource_argument(text):
+  kind, _, resource_version = text.partition("/")
+  if kind == "" or resource_version == "" or "/" in resource_version:
+    raise argparse.ArgumentTypeError(f"expected KIND/VERSION (ie: deployment/v1), got {text!r}")
+  return (kind, resource_version)
 
-      # 2 added because terraform has additional indent within "resource" block
-      this_leading_spaces = len(yaml_file_lines[i]) - len(yaml_file_lines[i].lstrip("- ")) + 2
-      if resource_version is None:
-        if KV_pair[0] == "apiVersion":
-          resource_version  = KV_pair[1].split("/")[-1]
-        else:
-          continue
-      
-      if kind is None:
-        #useful file info starts here
-        if KV_pair[0] == "kind":
-          kind = KV_pair[1].lower()
-          if re.search(r"(?<=[a-z])(?=[A-Z])", KV_pair[1]) is not None:
-            #convert to snake case when camel case detected
-            kind = re.sub(r'(?<=[a-z])(?=[A-Z])', '_', KV_pair[1]).lower()
-        else:
+# Purpose:
+#   This is the entry point for the "compile schemas" step. It writes a schema bundle holding the trees of the
+#   given resources, or of every resource used by the YAMLs in the YAML folder when none are given.
+# params:
+#    bundle_path: where the bundle is written
+#    resources: a list of (kind, resource_version) pairs (see parse_resource_argument()), or None
+
+def compile_schemas(bundle_path, resources=None):
+  if not resources:
+    resources = []
+    for file_name in os.listdir("YAML"):
+      resources.extend(read_resource_headers(rf"YAML/{file_name}"))
+  compiled = compile_schema_bundle(bundle_path, resources)
+  print(f"compiled {len(compiled)} resource schemas into {bundle_path}")
+
+# Purpose:
+#   This is the batch mode. It reads one JSON request per line ({"id": ..., "yaml": "..."}) and writes one JSON
+#   result per line as soon as each request is translated: {"id": ..., "terraform": "..."}, or {"id": ..., "error":
+#   "..."} for a request that failed. When some of a request's documents failed the result also holds
+#   "document_errors": [{"document": ..., "error": "..."}, ...] and the request counts as failed. A single warm
+#   process can translate any number of manifests this way.
+# params:
+#    input_stream: the stream requests are read from (ie: sys.stdin)
+#    output_stream: the stream results are written to (ie: sys.stdout)
+#    schema_provider: a function taking (kind, resource_version) and returning the resource's attribute tree
+# returns :
+#    the number of requests that failed
+
+def run_batch(input_stream, output_stream, schema_provider=resolve_attribute_tree):
+  failures = 0
+  for request_line in input_stream:
+    if not request_line.strip():
+      continue
+    request_id = None
+    try:
+      request = json.loads(request_line)
+      request_id = request.get("id")
+      document_errors = []
+      result = {"id": request_id, "terraform": translate_yaml(request["yaml"], schema_provider, document_errors)}
+      if document_errors:
+        failures += 1
+        result["document_errors"] = [{"document": document, "error": error} for document, error in document_errors]
+    except Exception as error:
+      failures += 1
+      result = {"id": request_id, "error": f"{type(error).__name__}: {error}"}
+    output_stream.write(json.dumps(result) + "\n")
+    output_stream.flush()
+  return failures
+
+# Purpose:
+#   This reports the files that change in a folder using Linux's inotify (through libc, so no extra package is
+#   needed). Raises OSError where inotify isn't available, see open_folder_watcher() for the fallback.
+# params:
+#    folder: the folder to watch
+
+class InotifyWatcher:
+  # IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+  EVENT_MASK = 0x2 | 0x8 | 0x40 | 0x80 | 0x100 | 0x200
+  # wd, mask, cookie and name length, followed by the (null padded) name
+  EVENT_HEADER = struct.Struct("iIII")
+
+  def __init__(self, folder):
+    import ctypes, ctypes.util
+    libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+    if not hasattr(libc, "inotify_init1"):
+      raise OSError("inotify is not available")
+    self.file_descriptor = libc.inotify_init1(os.O_CLOEXEC)
+    if self.file_descriptor < 0:
+      raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+    if libc.inotify_add_watch(self.file_descriptor, os.fsencode(folder), self.EVENT_MASK) < 0:
+      os.close(self.file_descriptor)
+      raise OSError(ctypes.get_errno(), f"could not watch {folder}")
+
+  # returns the names of the files that changed within timeout seconds (None waits for the first change)
+  def wait(self, timeout=None):
+    if not select.select([self.file_descriptor], [], [], timeout)[0]:
+      return set()
+    buffer = os.read(self.file_descriptor, 64 * 1024)
+    changed = set()
+    offset = 0
+    while offset < len(buffer):
+      _, _, _, name_length = self.EVENT_HEADER.unpack_from(buffer, offset)
+      offset += self.EVENT_HEADER.size
+      name = buffer[offset:offset + name_length].rstrip(b"\0")
+      offset += name_length
+      if name:
+        changed.add(os.fsdecode(name))
+    return changed
+
+  def close(self):
+    os.close(self.file_descriptor)
+
+# Purpose:
+#   This reports the files that change in a folder by comparing the modification time and size of every file
+#   between scans. It works everywhere and is used when inotify isn't available.
+# params:
+#    folder: the folder to watch
+#    interval: seconds between scans
+
+class PollingWatcher:
+  def __init__(self, folder, interval=None):
+    self.folder = folder
+    self.interval = watch_poll_seconds if interval is None else interval
+    self.snapshot = self.scan()
+
+  def scan(self):
+    snapshot = {}
+    with os.scandir(self.folder) as entries:
+      for entry in entries:
+        try:
+          stat = entry.stat()
+        except FileNotFoundError:
           continue
-      #### STEP ===> lookup Cached Version or scrape current version
-      if attribute_tree is None:
-        if cache_resource_trees:
-          cache_file = open("resource_cache.json", "w+")
-          try:
-            cache_json = json.load(cache_file)
-            attribute_tree = next((c for c in cache_json if c['kind'] == kind), None)
-            # if the file can be loaded, check if it has the current tree
-            if attribute_tree is None:
-              # if it doesn't have data, then go find it and write to file
-              attribute_tree = scrape(
-                SCRAPE_URL_1,
-                kind,
-                resource_version)
-              cache_json.append(attribute_tree)
-              json.dump(cache_json, cache_file)
-          except:
-            #fail to load cache? repopulate
-            attribute_tree = scrape(
-                SCRAPE_URL_1,
-                kind,
-                resource_version)
-            json.dump([attribute_tree], cache_file)
-          cache_file.close()
-        else:
-          attribute_tree = scrape(
-            SCRAPE_URL_1,
-            kind,
-            resource_version)
-      #### STEP ====> format file write data
-      if this_leading_spaces > last_leading_spaces:
-        # an indent has occurred
-        space_stack.append(this_leading_spaces)
-        # ensure last written line has correct curly brace
-        if write_lines[-1].rstrip()[-1] == ":":
-          write_lines[-1] = write_lines[-1].rstrip()[:-1].rstrip() + " {"
-        else:
-          write_lines[-1] = write_lines[-1].rstrip() + " {"
-      elif this_leading_spaces < last_leading_spaces:
-        # we just went down an indent
-        while space_stack[-1] > this_leading_spaces:
-          #close current blocks
-          tree_log.pop()
-          #popping space stack before appending to generate correct indents
-          space_stack.pop()
-          write_lines.append(' ' * space_stack[-1] + "}")
-      
-      if KV_pair[0] == "kind" and not kind_translated:
-        this_line += fr'resource "kubernetes_{KV_pair[1].lower()}" "REPLACE_ME" {{'
-        kind_translated = True
-      else :
-        this_line += ' ' * this_leading_spaces  # indents
-        res = terra_translate(KV_pair,
-          attribute_tree,
-          tree_log)  # returns a string with ['TERRAFORM_NAME', 'formatted printout']
-        this_line += res[1]
-
-      last_leading_spaces = this_leading_spaces
-      write_lines.append(this_line)
-    
-    # for writing closing curly braces at end of translation
-    while len(space_stack) > 1:
-      space_stack.pop()
-      write_lines.append(' ' * space_stack[-1] + "}")
-
-    #### STEP ====> write formatted file to new folder
-    tf_file_name = file_name.split(".")
-    file = open(f"{output_folder}/{tf_file_name[0]}.tf", "w+")
-    for text in write_lines:
-      file.write(text + "\n")
-
-    file.close()
-  print("DONE!!!")
+        snapshot[entry.name] = (stat.st_mtime_ns, stat.st_size)
+    return snapshot
 
-main()
+  # returns the names of the files that changed within timeout seconds (None waits for the first change)
+  def wait(self, timeout=None):
+    deadline = None if timeout is None else time.monotonic() + timeout
+    while True:
+      snapshot = self.scan()
+      changed = {name for name in snapshot.keys() | self.snapshot.keys() if snapshot.get(name) != self.snapshot.get(name)}
+      self.snapshot = snapshot
+      if changed:
+        return changed
+      if deadline is not None and time.monotonic() >= deadline:
+        return set()
+      time.sleep(self.interval if deadline is None else max(0, min(self.interval, deadline - time.monotonic())))
+
+  def close(self):
+    pass
+
+# returns an inotify watcher for the folder, or a polling watcher where inotify can't be used
+def open_folder_watcher(folder):
+  try:
+    return InotifyWatcher(folder)
+  except (OSError, AttributeError, TypeError):
+    return PollingWatcher(folder)
+
+# editor swap and backup files (ie: .example.yaml.swp, example.yaml~) are never translated in watch mode
+def is_watched_file(file_name):
+  return not file_name.startswith(".") and not file_name.endswith("~")
+
+# returns the names of the regular files in the folder that watch mode translates
+def list_watched_files(folder):
+  return [file_name for file_name in os.listdir(folder)
+    if is_watched_file(file_name) and os.path.isfile(os.path.join(folder, file_name))]
+
+# Purpose:
+#   This is the entry point for the watch mode. It brings the "tf files" folder up to date once, keeps the attribute
+#   trees of every resource in the YAML folder in memory and then re-translates each YAML as soon as it changes.
+#   Changes are collected until the folder has been quiet for watch_debounce_seconds, so an editor writing a file
+#   several times (or a checkout touching many files) leads to one translation per file. Runs until interrupted.
+# params:
+#    schema_bundle: path to a compiled schema bundle to translate from, defaults to schema_bundle_path
+
+def watch(schema_bundle=None):
+  global schema_bundle_path
+  if schema_bundle is not None:
+    schema_bundle_path = schema_bundle
+  yaml_folder = "YAML"
+  output_folder = './tf files'
+  os.makedirs(output_folder, exist_ok=True)
+  watcher = open_folder_watcher(yaml_folder)
+  file_names = list_watched_files(yaml_folder)
+  # keep every tree resident, including those of files that are already up to date
+  prefetch_attribute_trees(SCRAPE_URL_1, read_all_resource_headers(file_names, yaml_folder))
+  translate_changed_files(file_names, output_folder)
+  print(f"watching {yaml_folder} with {type(watcher).__name__}, press Ctrl+C to stop")
+  try:
+    while True:
+      try:
+        touched = watcher.wait()
+        while True:
+          more = watcher.wait(watch_debounce_seconds)
+          if not more:
+            break
+          touched |= more
+        start = time.perf_counter()
+        file_names = list_watched_files(yaml_folder)
+        candidates = [file_name for file_name in file_names if file_name in touched]
+        changed = translate_changed_files(file_names, output_folder, candidates=candidates)
+        if changed:
+          print(f"translated {', '.join(changed)} in {time.perf_counter() - start:.3f}s")
+      except Exception as error:
+        # one bad change shouldn't stop the watch, wait a moment so a lasting problem doesn't spin
+        print(f"could not update {output_folder}: {type(error).__name__}: {error}")
+        time.sleep(watch_poll_seconds)
+  except KeyboardInterrupt:
+    pass
+  finally:
+    watcher.close()
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description="Translate the k8s YAMLs in the YAML folder into .tf files.")
+  parser.add_argument("--workers", type=int, default=translation_workers,
+    help="number of processes translating files at the same time")
+  parser.add_argument("--schema-bundle", default=schema_bundle_path,
+    help="compiled schema bundle to translate from before using the cache or the registry")
+  parser.add_argument("--compile-schemas", metavar="BUNDLE",
+    help="write a schema bundle for --resources (or every resource in the YAML folder) and exit")
+  parser.add_argument("--resources", nargs="*", metavar="KIND/VERSION", type=parse_resource_argument,
+    help="resources to compile into the schema bundle, ie: deployment/v1 service/v1")
+  parser.add_argument("--report", metavar="PATH",
+    help="write a JSON report of the run's timers, counters and cache hit rates")
+  parser.add_argument("--profile", metavar="PATH",
+    help="run under cProfile and write the stats to PATH (view them with python -m pstats PATH)")
+  parser.add_argument("--incremental", action="store_true", default=incremental_translation,
+    help="keep the tf files folder and only re-translate the YAMLs that changed since the last run")
+  parser.add_argument("--watch", action="store_true",
+    help="keep the schemas in memory and re-translate each YAML as soon as it changes, until interrupted")
+  parser.add_argument("--batch", action="store_true",
+    help='translate NDJSON requests ({"id": ..., "yaml": ...}) from stdin and write NDJSON results to stdout')
+  args = parser.parse_args()
+  if args.compile_schemas:
+    compile_schemas(args.compile_schemas, args.resources)
+  elif args.batch:
+    provider = SchemaProvider(
+      SchemaBundle(args.schema_bundle) if args.schema_bundle else None,
+      SchemaCache(cache_directory, cache_ttl_seconds) if cache_resource_trees else None)
+    sys.exit(1 if run_batch(sys.stdin, sys.stdout, provider) else 0)
+  elif args.watch:
+    watch(schema_bundle=args.schema_bundle)
+  elif args.profile:
+    import cProfile
+    cProfile.run("main(workers=args.workers, schema_bundle=args.schema_bundle, report_path=args.report, "
+      "incremental=args.incremental)", args.profile)
+  else:
+    main(workers=args.workers, schema_bundle=args.schema_bundle, report_path=args.report,
+      incremental=args.incremental)
@@ -0,0 +1,508 @@
+import os, sys, re, io, json, time, subprocess
+import pytest, requests
+import main, benchmark
+
+YAML_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "YAML")
+
+
+# The env block pre-processing as it was before rewrite_env_blocks() replaced it, kept to check that the single
+# pass rewrite produces the same lines.
+def legacy_process_env_block(original_file_lines, initial_index):
+  processed_env_lines = []
+  env_indent_level = len(original_file_lines[initial_index]) - len(original_file_lines[initial_index].lstrip())
+  final_i=None
+  for i in range(initial_index + 1, len(original_file_lines)):
+    this_indent_level = len(original_file_lines[i]) - len(original_file_lines[i].lstrip())
+    this_line = original_file_lines[i].lstrip()
+    if re.search(r'#+.*', this_line):
+      continue
+    if this_indent_level<=env_indent_level :
+      final_i=i
+      break
+    if re.search(r'^-.*', this_line):
+      last_line = original_file_lines[i-1].strip()
+      if "env:" in last_line:
+        processed_env_lines.append(" " * (env_indent_level + 2) + this_line.lstrip("- "))
+      else:
+        processed_env_lines.append(" " * env_indent_level + "env:\n")
+        processed_env_lines.append(" " * (this_indent_level) + this_line.lstrip("- "))
+    else :
+      processed_env_lines.append(" " * (this_indent_level-2) + this_line)
+  return original_file_lines[:initial_index + 1] + processed_env_lines + original_file_lines[final_i:]
+
+def legacy_pre_process(original_file_lines):
+  pre_processed_lines = original_file_lines.copy()
+  for i in range(0, len(original_file_lines)):
+      if re.search(r"\s+env:.*", original_file_lines[i]):
+        pre_processed_lines = legacy_process_env_block(pre_processed_lines, i)
+  return pre_processed_lines
+
+def bundled_yaml_lines(file_name):
+  with open(os.path.join(YAML_FOLDER, file_name)) as yaml_file:
+    return yaml_file.readlines()
+
+
+@pytest.mark.parametrize("file_name", sorted(os.listdir(YAML_FOLDER)))
+def test_pre_process_matches_legacy_for_bundled_yamls(file_name):
+  lines = bundled_yaml_lines(file_name)
+  assert list(main.pre_process(lines)) == legacy_pre_process(lines)
+
+def test_pre_process_matches_legacy_for_single_env_block():
+  lines = [
+    "spec:\n",
+    "  containers:\n",
+    "    - name: app\n",
+    "      env:\n",
+    "        - name: A\n",
+    "          value: one\n",
+    "        - name: B\n",
+    "          valueFrom:\n",
+    "            secretKeyRef:\n",
+    "              name: secret\n",
+    "      image: app\n",
+  ]
+  assert list(main.pre_process(lines)) == legacy_pre_process(lines)
+
+def test_pre_process_matches_legacy_with_comment_in_env_block():
+  lines = [
+    "spec:\n",
+    "  containers:\n",
+    "    - name: app\n",
+    "      env:\n",
+    "        # the first variable\n",
+    "        - name: A\n",
+    "          value: one # trailing comment\n",
+    "        - name: B\n",
+    "          value: two\n",
+    "      image: app\n",
+  ]
+  assert list(main.pre_process(lines)) == legacy_pre_process(lines)
+
+# the legacy rewrite kept indices into the original lines after earlier blocks had changed the line count
+def test_pre_process_rewrites_every_env_block_in_a_file():
+  lines = [
+    "spec:\n",
+    "  containers:\n",
+    "    - name: a\n",
+    "      env:\n",
+    "        - name: A\n",
+    "          value: one\n",
+    "        - name: B\n",
+    "          value: two\n",
+    "    - name: b\n",
+    "      env:\n",
+    "        - name: C\n",
+    "          value: three\n",
+    "      image: x\n",
+  ]
+  assert list(main.pre_process(lines)) == [
+    "spec:\n",
+    "  containers:\n",
+    "    - name: a\n",
+    "      env:\n",
+    "        name: A\n",
+    "        value: one\n",
+    "      env:\n",
+    "        name: B\n",
+    "        value: two\n",
+    "    - name: b\n",
+    "      env:\n",
+    "        name: C\n",
+    "        value: three\n",
+    "      image: x\n",
+  ]
+
+# the legacy rewrite appended a second copy of the file when the env block was the last thing in it
+def test_pre_process_env_block_at_end_of_file():
+  lines = ["spec:\n", "  env:\n", "    - name: A\n", "      value: one\n"]
+  assert list(main.pre_process(lines)) == ["spec:\n", "  env:\n", "    name: A\n", "    value: one\n"]
+
+
+FIXTURE_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "test_fixtures")
+
+# abridged resource docs in the layout of the old kubernetes provider docs (WORKING_PROVIDER_VERSION)
+def linked_fixture_tree(kind):
+  with open(os.path.join(FIXTURE_FOLDER, f"{kind}_v1.md")) as doc_file:
+    attribute_tree = main.parse_resource_doc(doc_file.read(), f"kubernetes_{kind}", "v1")
+  exported = main.export_attribute_tree(attribute_tree)
+  assert list(exported) == [f"kubernetes_{kind}"]
+  return exported[f"kubernetes_{kind}"]
+
+# reduces an exported attribute to {child name: shape} (None for attributes without children)
+def tree_shape(attribute):
+  if attribute['children'] is None:
+    return None
+  return {name: tree_shape(child) for name, child in attribute['children'].items()}
+
+METADATA_SHAPE = {"annotations": None, "labels": None, "name": None, "namespace": None, "uid": None}
+
+def test_linked_deployment_tree():
+  assert tree_shape(linked_fixture_tree("deployment")) == {
+    "metadata": METADATA_SHAPE,
+    "spec": {
+      "replicas": None,
+      "selector": {},
+      "template": {
+        "metadata": METADATA_SHAPE,
+        "spec": {
+          "container": {
+            "env": {"name": None, "value": None, "value_from": {"secret_key_ref": {"key": None, "name": None}}},
+            "image": None,
+            "name": None,
+            "port": {"container_port": None, "name": None},
+          },
+          "security_context": None,
+        },
+      },
+    },
+    "wait_for_rollout": None,
+  }
+
+def test_linked_service_tree():
+  assert tree_shape(linked_fixture_tree("service")) == {
+    "metadata": {"labels": None, "name": None, "namespace": None},
+    "spec": {
+      "port": {"name": None, "port": None, "protocol": None, "target_port": None},
+      "selector": None,
+      "type": None,
+    },
+  }
+
+def test_linked_stateful_set_tree():
+  compute = {"cpu": None, "memory": None}
+  assert tree_shape(linked_fixture_tree("stateful_set")) == {
+    "metadata": {"labels": None, "name": None},
+    "spec": {
+      "replicas": None,
+      "selector": {},
+      "service_name": None,
+      "template": {
+        "metadata": {"labels": None, "name": None},
+        "spec": {"container": {"name": None, "resources": {"limits": compute, "requests": compute}}},
+      },
+      "volume_claim_template": None,
+    },
+  }
+
+# a child is linked to the first section of its name that no other attribute has claimed yet
+def test_duplicate_section_names_link_to_nearest_unassigned_section():
+  deployment = linked_fixture_tree("deployment")
+  deployment_spec = deployment['children']['spec']
+  pod_spec = deployment_spec['children']['template']['children']['spec']
+  assert "replicas" in deployment_spec['children']
+  assert "container" in pod_spec['children']
+  assert deployment_spec['has_parent'] and pod_spec['has_parent']
+  # both metadata attributes share the one documented metadata section
+  assert deployment['children']['metadata'] is deployment_spec['children']['template']['children']['metadata']
+
+def test_multi_block_header_documents_both_sections():
+  resources = linked_fixture_tree("stateful_set")['children']['spec']['children']['template']['children']['spec'][
+    'children']['container']['children']['resources']
+  limits, requests = resources['children']['limits'], resources['children']['requests']
+  assert limits is not requests
+  assert limits == requests == {
+    'children': {
+      "cpu": {'children': None, 'has_parent': True, 'can_have_children': True},
+      "memory": {'children': None, 'has_parent': True, 'can_have_children': True},
+    },
+    'has_parent': True,
+    'can_have_children': True,
+  }
+
+def test_parent_child_section_links_under_its_parent():
+  template = linked_fixture_tree("stateful_set")['children']['spec']['children']['template']
+  assert list(template['children']['spec']['children']) == ["container"]
+  assert template['children']['spec']['has_parent'] is True
+
+def test_pod_security_context_stays_unlinked_in_deployments():
+  pod_spec = linked_fixture_tree("deployment")['children']['spec']['children']['template']['children']['spec']
+  assert pod_spec['children']['security_context'] == {'children': None, 'has_parent': True, 'can_have_children': True}
+
+def test_redirect_target_is_recorded():
+  volume_claim_template = linked_fixture_tree("stateful_set")['children']['spec']['children']['volume_claim_template']
+  assert volume_claim_template == {'children': None, 'has_parent': True, 'can_have_children': False,
+    'redirect': "persistent_volume_claim/v1#argument-reference"}
+
+
+# Purpose:
+#   This answers registry requests with the fixture docs and appends every requested URL to a log file, so requests
+#   made from worker processes are counted too.
+
+class FixtureRegistrySession(benchmark.SyntheticRegistrySession):
+  def __init__(self, log_path, kinds=("deployment", "service", "stateful_set", "persistent_volume_claim")):
+    super().__init__([(kind, "v1") for kind in kinds])
+    for kind in kinds:
+      with open(os.path.join(FIXTURE_FOLDER, f"{kind}_v1.md")) as doc_file:
+        self.pages[f"kubernetes_{kind}_v1"] = doc_file.read()
+    self.log_path = log_path
+    # URLs that fail once with a connection error
+    self.fail_once = set()
+    # seconds every response takes, so concurrent requests overlap
+    self.delay_seconds = 0
+
+  def get(self, url, timeout=None):
+    with open(self.log_path, "a") as log_file:
+      log_file.write(url + "\n")
+    if url in self.fail_once:
+      self.fail_once.discard(url)
+      raise requests.ConnectionError(f"could not reach {url}")
+    time.sleep(self.delay_seconds)
+    return super().get(url, timeout)
+
+  def requested(self, fragment):
+    with open(self.log_path) as log_file:
+      return sum(fragment in url for url in log_file)
+
+@pytest.fixture
+def registry(tmp_path):
+  benchmark.reset_main_state()
+  session = FixtureRegistrySession(str(tmp_path / "requests.log"))
+  previous_session = main.http_session
+  main.http_session = session
+  yield session
+  main.http_session = previous_session
+  benchmark.reset_main_state()
+
+def test_concurrent_prefetch_downloads_the_provider_docs_once(registry):
+  registry.delay_seconds = 0.05
+  kinds = ("deployment", "service", "stateful_set", "persistent_volume_claim")
+  main.prefetch_attribute_trees(main.SCRAPE_URL_1, [(kind, "v1") for kind in kinds], max_workers=len(kinds))
+  assert all((main.WORKING_PROVIDER_VERSION, kind, "v1") in main.attribute_trees for kind in kinds)
+  assert registry.requested("/v2/providers/") == 1
+  assert registry.requested("/v2/provider-versions/") == 1
+  assert registry.requested("/v2/provider-docs/") == len(kinds)
+
+# the module level lookup is a SchemaProvider, so it uses the module's cache settings and shares its trees
+def test_get_attribute_tree_is_a_schema_provider_lookup(registry, tmp_path, monkeypatch):
+  monkeypatch.setattr(main, "cache_resource_trees", True)
+  monkeypatch.setattr(main, "cache_directory", str(tmp_path / "cache"))
+  main.metrics.reset()
+  service = main.get_attribute_tree(main.SCRAPE_URL_1, "service", "v1")
+  assert main.SchemaProvider(trees=main.attribute_trees)("service", "v1") is service
+  assert main.SchemaCache(str(tmp_path / "cache")).load(main.WORKING_PROVIDER_VERSION, "service", "v1") is not None
+  counters = main.metrics.snapshot()["counters"]
+  assert (counters["cache.memory.misses"], counters["cache.memory.hits"], counters["cache.disk.misses"]) == (1, 1, 1)
+
+PERSISTENT_VOLUME_CLAIM_DOC = "/v2/provider-docs/kubernetes_persistent_volume_claim_v1"
+
+def test_redirect_is_resolved_on_first_descent_and_shared(registry):
+  plain = "apiVersion: apps/v1\nkind: StatefulSet\nmetadata:\n  name: web\n"
+  main.translate_yaml(plain)
+  assert registry.requested(PERSISTENT_VOLUME_CLAIM_DOC) == 0
+
+  stateful_set = "".join(bundled_yaml_lines("example_stateful_set.yaml"))
+  translated = main.translate_yaml(stateful_set)
+  assert "    volume_claim_template {\n      metadata {\n" in translated
+  assert "        access_modes = [\"ReadWriteOnce\"]\n" in translated
+  assert main.translate_yaml(stateful_set) == translated
+  assert registry.requested(PERSISTENT_VOLUME_CLAIM_DOC) == 1
+
+def test_redirect_is_kept_after_a_registry_error(registry):
+  registry.fail_once.add("https://registry.terraform.io" + PERSISTENT_VOLUME_CLAIM_DOC)
+  stateful_set = "".join(bundled_yaml_lines("example_stateful_set.yaml"))
+  with pytest.raises(requests.ConnectionError):
+    main.translate_yaml(stateful_set)
+  assert "access_modes" in main.translate_yaml(stateful_set)
+
+def write_yaml_copies(file_names, text):
+  for file_name in file_names:
+    with open(os.path.join("YAML", file_name), "w") as yaml_file:
+      yaml_file.write(text)
+
+# workers only fetch a redirect target once a file descends into it, and then at most once each
+def test_workers_resolve_redirects_lazily(registry, yaml_folder, monkeypatch):
+  # worker processes are forked, so they inherit the fixture registry instead of opening a real session
+  monkeypatch.setattr(main, "get_http_session", lambda: registry)
+  plain_names = [f"plain_{number}.yaml" for number in range(4)]
+  write_yaml_copies(plain_names, "apiVersion: apps/v1\nkind: StatefulSet\nmetadata:\n  name: web\n")
+  main.prefetch_attribute_trees(main.SCRAPE_URL_1, [("stateful_set", "v1")])
+  assert main.translate_files(plain_names, "out", workers=2) == [(file_name, None) for file_name in plain_names]
+  assert registry.requested(PERSISTENT_VOLUME_CLAIM_DOC) == 0
+
+  file_names = [f"stateful_set_{number}.yaml" for number in range(4)]
+  write_yaml_copies(file_names, "".join(bundled_yaml_lines("example_stateful_set.yaml")))
+  assert main.translate_files(file_names, "out", workers=2) == [(file_name, None) for file_name in file_names]
+  assert 1 <= registry.requested(PERSISTENT_VOLUME_CLAIM_DOC) <= 2
+  for file_name in file_names:
+    with open(os.path.join("out", main.tf_file_name(file_name))) as tf_file:
+      assert "access_modes" in tf_file.read()
+
+# a tree whose "rule" attribute links back onto itself and whose "metadata" is shared by two parents
+def looping_attribute_tree():
+  metadata = {'children': {"name": {'children': None}}, 'has_parent': True}
+  rule = {'children': {"match": {'children': {}, 'can_have_children': True}}, 'has_parent': True}
+  rule['children']["rule"] = rule
+  spec = {'children': {"rule": rule, "metadata": metadata, "volume": {'children': None, 'redirect': "volume/v1"}}}
+  return main.compact_attribute_tree({"policy": {'children': {"metadata": metadata, "spec": spec}}})
+
+def test_schema_cache_keeps_loops_and_shared_attributes(tmp_path):
+  schema_cache = main.SchemaCache(str(tmp_path))
+  assert schema_cache.store(main.WORKING_PROVIDER_VERSION, "policy", "v1", looping_attribute_tree())
+  policy = schema_cache.load(main.WORKING_PROVIDER_VERSION, "policy", "v1")["policy"]
+  spec = policy.child("spec")
+  rule = spec.child("rule")
+  assert rule.child("rule") is rule
+  assert rule.has_parent and rule.child("match").can_have_children and rule.child("match").names == ()
+  assert spec.child("metadata") is policy.child("metadata")
+  assert policy.child("metadata").child("name").names is None
+  assert spec.child("volume").redirect == "volume/v1"
+  assert spec.names == ("rule", "metadata", "volume")
+
+def test_failed_cache_store_is_counted_and_reported(registry, tmp_path, monkeypatch, capsys):
+  schema_cache = main.SchemaCache(str(tmp_path / "cache"))
+  monkeypatch.setattr(schema_cache, "store", lambda *args: False)
+  main.metrics.reset()
+  main.acquire_attribute_tree(main.SCRAPE_URL_1, "service", "v1", schema_cache=schema_cache)
+  assert main.metrics.snapshot()["counters"]["cache.disk.store_failures"] == 1
+  assert "could not cache service v1" in capsys.readouterr().err
+
+@pytest.fixture
+def yaml_folder(tmp_path, monkeypatch):
+  monkeypatch.chdir(tmp_path)
+  os.makedirs("YAML")
+  os.makedirs("out")
+  with open(os.path.join("YAML", "example_service.yml"), "w") as yaml_file:
+    yaml_file.writelines(bundled_yaml_lines("example_service.yml"))
+  return tmp_path
+
+def test_translate_changed_files_skips_folders_and_removed_files(registry, yaml_folder):
+  os.makedirs(os.path.join("YAML", "nested"))
+  changed = main.translate_changed_files(["example_service.yml", "nested", "removed.yaml"], "out")
+  assert changed == ["example_service.yml"]
+  assert os.path.exists(os.path.join("out", "example_service.tf"))
+
+def test_list_watched_files_skips_folders_and_editor_files(yaml_folder):
+  os.makedirs(os.path.join("YAML", "nested"))
+  for file_name in (".example_service.yml.swp", "example_service.yml~"):
+    open(os.path.join("YAML", file_name), "w").close()
+  assert main.list_watched_files("YAML") == ["example_service.yml"]
+
+# a watcher that reports the given batches of changes (each followed by a quiet debounce) and then stops the watch
+class ScriptedWatcher:
+  def __init__(self, batches):
+    self.results = []
+    for batch in batches:
+      self.results += [set(batch), set()]
+
+  def wait(self, timeout=None):
+    if not self.results:
+      raise KeyboardInterrupt
+    return self.results.pop(0)
+
+  def close(self):
+    pass
+
+def test_watch_keeps_running_after_a_failed_update(registry, yaml_folder, monkeypatch):
+  monkeypatch.setattr(main, "open_folder_watcher", lambda folder: ScriptedWatcher([["example_service.yml"]] * 2))
+  monkeypatch.setattr(main, "watch_poll_seconds", 0)
+  real_translate_changed_files = main.translate_changed_files
+  calls = []
+  def translate_changed_files(file_names, output_folder, workers=1, candidates=None):
+    calls.append(candidates)
+    if len(calls) == 2:
+      raise IsADirectoryError("YAML/nested")
+    return real_translate_changed_files(file_names, output_folder, workers, candidates)
+  monkeypatch.setattr(main, "translate_changed_files", translate_changed_files)
+  main.watch()
+  assert calls == [None, ["example_service.yml"], ["example_service.yml"]]
+
+SERVICE_YAML = "apiVersion: v1\nkind: Service\nmetadata:\n  labels:\n"
+
+def test_translate_yaml_last_key_without_newline(registry):
+  assert main.translate_yaml(SERVICE_YAML.rstrip("\n")) == main.translate_yaml(SERVICE_YAML)
+  assert main.parse_line("  labels:") == ["labels", ""]
+
+def test_translate_yaml_multi_document(registry):
+  documents = "---\n".join(SERVICE_YAML.replace("labels:", f"name: {name}") for name in ("a", "b"))
+  terraform = main.translate_yaml(documents)
+  assert terraform.count('resource "kubernetes_service"') == 2
+  assert '"REPLACE_ME"' in terraform and '"REPLACE_ME_2"' in terraform
+  assert terraform.index('name = "a"') < terraform.index('name = "b"')
+
+# form feeds, \u2028 and the like are only line breaks to str.splitlines(), not to a file being read
+def test_translate_yaml_splits_lines_like_translate_file(registry, yaml_folder):
+  yaml_text = "apiVersion: v1\r\nkind: Service\r\nmetadata:\r\n  labels:\r\n    note: a\u2028b\x0cc\x1dd\x85e\n  name: web"
+  with open(os.path.join("YAML", "separators.yaml"), "w", newline="") as yaml_file:
+    yaml_file.write(yaml_text)
+  assert main.translate_files(["separators.yaml"], "out") == [("separators.yaml", None)]
+  with open(os.path.join("out", "separators.tf")) as tf_file:
+    assert main.translate_yaml(yaml_text) == tf_file.read()
+
+def test_run_batch_reports_each_failed_request_and_carries_on(registry):
+  requests_text = "\n".join([
+    json.dumps({"id": 1, "yaml": SERVICE_YAML}),
+    "not json",
+    "",
+    json.dumps({"id": 3, "yaml": "apiVersion: v1\nkind: Secret\nmetadata:\n  name: a\n"}),
+    json.dumps({"id": 4, "yaml": SERVICE_YAML.rstrip("\n")}),
+    json.dumps({"id": 5}),
+  ]) + "\n"
+  output_stream = io.StringIO()
+  assert main.run_batch(io.StringIO(requests_text), output_stream) == 3
+  results = [json.loads(line) for line in output_stream.getvalue().splitlines()]
+  assert [result["id"] for result in results] == [1, None, 3, 4, 5]
+  assert results[0]["terraform"] == results[3]["terraform"] == main.translate_yaml(SERVICE_YAML)
+  assert "document_errors" not in results[0]
+  assert results[1]["error"].startswith("JSONDecodeError")
+  assert results[2]["document_errors"] == [
+    {"document": 1, "error": "ValueError: no terraform resource doc found for secret v1"}]
+  assert results[2]["terraform"].startswith("# could not translate document 1: ValueError")
+  assert results[4]["error"] == "KeyError: 'yaml'"
+
+MIXED_YAML = "---\n".join([
+  SERVICE_YAML.replace("labels:", "name: a"),
+  "apiVersion: example.com/v1\nkind: MyCustom\nmetadata:\n  name: custom\n",
+  SERVICE_YAML.replace("labels:", "name: b"),
+])
+
+# one document without a terraform doc is reported and the documents around it are still translated
+def test_translate_documents_skips_a_failed_document(registry):
+  document_errors = []
+  terraform = main.translate_yaml("---\n" + MIXED_YAML, document_errors=document_errors)
+  assert document_errors == [(2, "ValueError: no terraform resource doc found for my_custom v1")]
+  blocks = terraform.split("\n\n")
+  assert len(blocks) == 3
+  assert blocks[0].startswith('resource "kubernetes_service" "REPLACE_ME" {') and 'name = "a"' in blocks[0]
+  assert blocks[1] == "# could not translate document 2: ValueError: no terraform resource doc found for my_custom v1"
+  assert blocks[2].startswith('resource "kubernetes_service" "REPLACE_ME_2" {') and 'name = "b"' in blocks[2]
+
+def test_translate_file_reports_failed_documents_per_file(registry, yaml_folder, capsys):
+  with open(os.path.join("YAML", "mixed.yaml"), "w") as yaml_file:
+    yaml_file.write(MIXED_YAML)
+  main.metrics.reset()
+  assert main.translate_files(["mixed.yaml"], "out") == [("mixed.yaml", None)]
+  with open(os.path.join("out", "mixed.tf")) as tf_file:
+    assert tf_file.read() == main.translate_yaml(MIXED_YAML)
+  assert "could not translate document 2 of mixed.yaml: ValueError" in capsys.readouterr().out
+  file_report = main.metrics.snapshot()["files"]["mixed.yaml"]
+  assert file_report["error"] is None
+  assert file_report["document_errors"] == [
+    {"document": 2, "error": "ValueError: no terraform resource doc found for my_custom v1"}]
+
+def test_per_line_counters_only_run_with_metrics_enabled(registry):
+  main.translate_yaml(SERVICE_YAML)
+  per_line = ("translate.calls", "cache.match.hits", "cache.match.misses")
+  for enabled in (False, True):
+    main.metrics.reset()
+    main.metrics.enabled = enabled
+    try:
+      main.translate_yaml(SERVICE_YAML + "spec:\n  customField:\n    a: b\n")
+    finally:
+      main.metrics.enabled = False
+    counters = main.metrics.snapshot()["counters"]
+    assert any(name in counters for name in per_line) == enabled
+    assert ("translate.placeholder_fallbacks" in counters) == enabled
+
+def test_resource_argument_is_split_into_kind_and_version():
+  assert main.parse_resource_argument("stateful_set/v1") == ("stateful_set", "v1")
+
+@pytest.mark.parametrize("text", ["deployment", "/v1", "deployment/", "apps/deployment/v1"])
+def test_resource_arguments_need_a_kind_and_a_version(text):
+  with pytest.raises(main.argparse.ArgumentTypeError, match="expected KIND/VERSION"):
+    main.parse_resource_argument(text)
+
+def test_compile_schemas_reports_a_resource_without_a_version(tmp_path):
+  completed = subprocess.run([sys.executable, main.__file__, "--compile-schemas", str(tmp_path / "schemas.bin"),
+    "--resources", "service/v1", "deployment"], cwd=tmp_path, capture_output=True, text=True)
+  assert completed.returncode == 2
+  assert "argument --resources: expected KIND/VERSION (ie: deployment/v1), got 'deployment'" in completed.stderr